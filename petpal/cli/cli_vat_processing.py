@@ -1,39 +1,67 @@
 # pylint: skip-file
 import os
+import re
+import csv
+import json
 import glob
+import shutil
+import hashlib
 import argparse
-import pandas as pd
-from petpal.kinetic_modeling import graphical_analysis,rtm_analysis
-from petpal.preproc import image_operations_4d, motion_corr, register, segmentation_tools
-from petpal.preproc import symmetric_geometric_transfer_matrix as sgtm
-from petpal.utils.bids_utils import gen_bids_like_dir_path, gen_bids_like_filename, gen_bids_like_filepath
-from petpal.utils.image_io import km_regional_fits_to_tsv
-from petpal.utils import useful_functions
-from petpal.utils.constants import HALF_LIVES
+import functools
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 _VAT_EXAMPLE_ = (r"""
 Example:
   - Running many subjects:
     petpal-vat-proc --subjects participants.tsv --out-dir /path/to/output --pet-dir /path/to/pet/folder/ --reg-dir /path/to/subject/Registrations/
+  - Reading cohort directories from a JSON file and a locally staged label file:
+    petpal-vat-proc --subjects participants.tsv --out-dir /path/to/output --cohort-map cohorts.json --dseg-tsv /tmp/dseg.tsv
+
+    where cohorts.json looks like {"VATDYS": {"pet": "/path/to/pet", "fs": "/path/to/freesurfer"}, ...}
+
+Note:
+  Intermediate images (cropped, motion corrected, registered and weighted series sum PET) are
+  written as uncompressed .nii, which is much faster to write and read than .nii.gz but takes
+  several times more disk space. Final outputs such as the SUVR image stay .nii.gz.
 """)
+
+# protocol settings shared by every subject
+_SEGMENTATION_LABEL_FILE = '/home/usr/goldmann/dseg.tsv'
+_RADIONUCLIDE = 'f18'
+_CROP_THRESH = 0.03
+_MOTION_TARGET = (0, 600)
+_MOCO_WINDOW_SIZE = 300
+_REG_PARS = MappingProxyType({'aff_metric': 'mattes', 'type_of_transform': 'DenseRigid'})
+_KM_T_THRESH_IN_MINS = 10
+_SUVR_START = 1800
+_SUVR_END = 7200
+_PVC_FWHM_MM = 4.2
+
+_GROUPS = MappingProxyType({'PIB': 'HC', 'VATNL': 'HC', 'VATDYS': 'CD'})
+
+
 def infer_group(sub_id: str):
     """
-    Infer the group a subject belongs to based on the subject ID.
+    Infer the group a subject belongs to based on the prefix of the subject ID.
 
-    PIB and VATNL belong to 'HC' group while VATDYS belongs to CD group.
+    PIB and VATNL belong to 'HC' group while VATDYS belongs to CD group. Subjects with any other
+    prefix are 'UNK'.
     """
-    group = 'UNK'
-    if 'PIB' in sub_id:
-        group = 'HC'
-    if 'VATNL' in sub_id:
-        group = 'HC'
-    if 'VATDYS' in sub_id:
-        group = 'CD'
-    return group
+    sub_id = sub_id.removeprefix('sub-')
+    for prefix, group in _GROUPS.items():
+        if sub_id.startswith(prefix):
+            return group
+    return 'UNK'
+
+
+_VAT_RE = re.compile(r'^(VAT\w+)$')
+_PIB_RE = re.compile(r'^(PIB[^_]*)_([^_]+)$')
 
 
-def rename_subs(sub: str):
+@functools.lru_cache(maxsize=None)
+def rename_subs(sub: str) -> tuple[str, str]:
     """
     Handle converting subject ID to BIDS structure.
 
@@ -43,32 +71,103 @@ def rename_subs(sub: str):
     returns:
         - subject part string
         - session part string
+
+    raises:
+        ValueError: If the subject ID matches neither the VAT nor the PIB naming scheme.
     """
-    if 'VAT' in sub:
-        return [f'sub-{sub}', 'ses-VYr0']
-    elif 'PIB' in sub:
-        subname, sesname = sub.split('_')
-        subname = subname.replace('-','')
-        subname = f'sub-{subname}'
-        sesname = f'ses-{sesname}'
-        return [subname, sesname]
+    vat_match = _VAT_RE.match(sub)
+    if vat_match:
+        return f'sub-{vat_match.group(1)}', 'ses-VYr0'
+    pib_match = _PIB_RE.match(sub)
+    if pib_match:
+        subname, sesname = pib_match.groups()
+        return f'sub-{subname.replace("-","")}', f'ses-{sesname}'
+    raise ValueError(f'Unrecognized subject ID {sub}')
+
+
+@functools.lru_cache(maxsize=None)
+def _list_dir_names(directory: str) -> frozenset:
+    """
+    List the entry names of a directory in a single ``os.scandir`` pass. Cached so that subjects
+    sharing a cohort directory reuse the listing. Missing directories give an empty set.
+    """
+    try:
+        with os.scandir(directory or '.') as entries:
+            return frozenset(entry.name for entry in entries)
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
+
+
+def _missing_files(paths: list) -> list:
+    """
+    Get the files in ``paths`` that do not exist, listing each parent directory only once.
+    """
+    return [path for path in paths
+            if os.path.basename(path) not in _list_dir_names(os.path.dirname(path))]
+
+
+def _input_fingerprint(*paths: str) -> str:
+    """
+    Hash the absolute path, modification time and size of each input file. This is much cheaper
+    than hashing file contents and changes whenever an input is replaced or rewritten.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}\n'.encode())
+    return digest.hexdigest()
+
+
+def _run_cached(cache_dir: str, inputs: tuple, outputs: tuple, compute):
+    """
+    Run ``compute`` to produce ``outputs`` from ``inputs``, unless a previous run on the same
+    inputs left copies of the outputs in ``cache_dir``, in which case those are copied instead.
+    """
+    key = _input_fingerprint(*inputs)
+    cached_outputs = [os.path.join(cache_dir, f'{key}_{os.path.basename(output)}') for output in outputs]
+    if all(os.path.exists(cached) for cached in cached_outputs):
+        for cached, output in zip(cached_outputs, outputs):
+            shutil.copy2(cached, output)
+        return
+    compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    for output, cached in zip(outputs, cached_outputs):
+        shutil.copy2(output, cached)
+
+
+def _step_needed(step: str, skip: list, force: bool, *outputs: str) -> bool:
+    """
+    Decide whether a pipeline step should run. A step runs unless it is listed in ``skip`` or,
+    when ``force`` is not set, all of its outputs already exist on disk.
+    """
+    if step in skip:
+        return False
+    return force or not all(os.path.exists(output) for output in outputs)
 
 
 def vat_protocol(subjstring: str,
                  out_dir: str,
                  pet_dir: str,
                  fs_dir: str,
-                 skip: list):
+                 skip: list,
+                 force: bool=False,
+                 keep_intermediates: bool=False,
+                 seg_tsv: str=_SEGMENTATION_LABEL_FILE,
+                 vectorized: bool=True):
+    # processing modules (and with them ants, nibabel and pandas) are imported where they are
+    # used so that the module itself only depends on the standard library
+    from petpal.kinetic_modeling import graphical_analysis,rtm_analysis
+    from petpal.preproc import image_operations_4d, motion_corr, register, segmentation_tools
+    from petpal.preproc import symmetric_geometric_transfer_matrix as sgtm
+    from petpal.utils.bids_utils import gen_bids_like_dir_path, gen_bids_like_filename, gen_bids_like_filepath
+    from petpal.utils.image_io import km_regional_fits_to_tsv
+    from petpal.utils import useful_functions
+    from petpal.utils.constants import HALF_LIVES
+    from petpal.utils.scan_timing import ScanTimingInfo
     sub, ses = rename_subs(subjstring)
     sub_id = sub.replace('sub-','')
     ses_id = ses.replace('ses-','')
-    segmentation_label_file = '/home/usr/goldmann/dseg.tsv'
-    motion_target = (0,600)
-    reg_pars = {'aff_metric': 'mattes','type_of_transform': 'DenseRigid'}
-    half_life = HALF_LIVES['f18']
-    suvr_start = 1800
-    suvr_end = 7200
-    pvc_fwhm_mm = 4.2
+    half_life = HALF_LIVES[_RADIONUCLIDE]
     if 'VAT' in sub:
         pet_file = f'{pet_dir}/{sub}/pet/{sub}_pet.nii.gz'
         freesurfer_file = glob.glob(f'{fs_dir}/{subjstring}*/mri/aparc+aseg.mgz')[0]
@@ -91,132 +190,267 @@ def vat_protocol(subjstring: str,
         atlas_warp_file,
         mpr_brain_mask_file
     ]
-    for check in real_files:
-        if not os.path.exists(check):
-            print(f'{check} not found')
+    for check in _missing_files(real_files):
+        print(f'{check} not found')
     print(real_files)
 
+    # every PET derivative keeps the frames of the input PET, so its timing is read once here
+    frame_timing = ScanTimingInfo.from_nifti(image_path=pet_file)
+
 
     def vat_bids_filepath(suffix,folder,**extra_desc):
+        return gen_bids_like_filepath(sub_id=sub_id,
+                                      ses_id=ses_id,
+                                      bids_dir=out_dir,
+                                      modality=folder,
+                                      suffix=suffix,
+                                      **extra_desc)
+
+    def vat_bids_dir(folder):
+        return gen_bids_like_dir_path(sub_id=sub_id,ses_id=ses_id,sup_dir=out_dir,modality=folder)
 
-        new_dir = gen_bids_like_dir_path(sub_id=sub_id,
-                                         ses_id=ses_id,
-                                         sup_dir=out_dir,
-                                         modality=folder)
+    # intermediate images are written uncompressed; gzip dominates I/O time for 4D PET
+    paths = {
+        'pet_cropped': vat_bids_filepath(suffix='pet',folder='pet',crop='003',ext='.nii'),
+        'pet_moco': vat_bids_filepath(suffix='pet',folder='pet',moco='windowed',ext='.nii'),
+        'pet_reg_anat': vat_bids_filepath(suffix='pet',folder='pet',moco='windowed',space='mpr',ext='.nii'),
+        'wm_ref_region_roi': vat_bids_filepath(suffix='seg',folder='pet',desc='RefRegionROI'),
+        'wm_ref_segmentation': vat_bids_filepath(suffix='seg',folder='pet',desc='RefRegionSegmentation'),
+        'wmref_tac': vat_bids_filepath(suffix='tac',folder='tacs',seg='WMRef',ext='.tsv'),
+        'mrtm1_tsv': vat_bids_filepath(suffix='fits',model='mrtm1',folder='km',ext='.tsv'),
+        'logan_tsv': vat_bids_filepath(suffix='fits',model='altlogan',folder='km',ext='.tsv'),
+        'wss': vat_bids_filepath(suffix='pet',folder='pet',space='mpr',desc='WSS',ext='.nii'),
+        'suvr': vat_bids_filepath(suffix='pet',folder='pet',space='mpr',desc='SUVR'),
+        'suvr_pvc': vat_bids_filepath(suffix='pet',folder='pet',space='mpr',pvc='SGTM',desc='SUVR',ext='.tsv'),
+    }
+    tac_save_dir = vat_bids_dir('tacs')
+    mrtm_save_dir = vat_bids_dir('mrtm_fits')
+    logan_save_dir = vat_bids_dir('logan_fits')
+    for new_dir in {tac_save_dir, mrtm_save_dir, logan_save_dir, *map(os.path.dirname, paths.values())}:
         os.makedirs(new_dir,exist_ok=True)
-        new_file = gen_bids_like_filepath(sub_id=sub_id,
-                                          ses_id=ses_id,
-                                          bids_dir=out_dir,
-                                          modality=folder,
-                                          suffix=suffix,
-                                          **extra_desc)
+    tac_prefix = f'{sub}_{ses}'
+    mrtm1_path = gen_bids_like_filename(sub_id=sub_id,ses_id=ses_id,model='mrtm1',suffix='fits',ext='')
+    logan_path = gen_bids_like_filename(sub_id=sub_id,ses_id=ses_id,model='altlogan',suffix='fits',ext='')
 
-        return new_file
+    # preprocessing
+    run_crop = _step_needed('crop',skip,force,paths['pet_cropped'])
+    run_moco = _step_needed('moco',skip,force,paths['pet_moco'])
+    if run_crop and run_moco and not keep_intermediates:
+        # hand the cropped image to motion correction in memory instead of round-tripping it to disk
+        pet_cropped_image = image_operations_4d.SimpleAutoImageCropper.get_cropped_ants_image(input_image_path=pet_file,
+                                                                                              thresh=_CROP_THRESH)
+        motion_corr.windowed_motion_corr_to_target(input_image_path=pet_file,
+                                                out_image_path=paths['pet_moco'],
+                                                motion_target_option=_MOTION_TARGET,
+                                                w_size=_MOCO_WINDOW_SIZE,
+                                                input_image=pet_cropped_image)
+        del pet_cropped_image
+    else:
+        if run_crop:
+            image_operations_4d.SimpleAutoImageCropper(input_image_path=pet_file,
+                                                       out_image_path=paths['pet_cropped'],
+                                                       thresh_val=_CROP_THRESH)
 
+        if run_moco:
+            motion_corr.windowed_motion_corr_to_target(input_image_path=paths['pet_cropped'],
+                                                    out_image_path=paths['pet_moco'],
+                                                    motion_target_option=_MOTION_TARGET,
+                                                    w_size=_MOCO_WINDOW_SIZE)
 
-    # preprocessing
-    pet_cropped_file = vat_bids_filepath(suffix='pet',folder='pet',crop='003')
-    if 'crop' not in skip:
-        image_operations_4d.SimpleAutoImageCropper(input_image_path=pet_file,
-                                                   out_image_path=pet_cropped_file,
-                                                   thresh_val=0.03)
-
-    pet_moco_file = vat_bids_filepath(suffix='pet',folder='pet',moco='windowed')
-    if 'moco' not in skip:
-        motion_corr.windowed_motion_corr_to_target(input_image_path=pet_cropped_file,
-                                                out_image_path=pet_moco_file,
-                                                motion_target_option=motion_target,
-                                                w_size=300)
-
-    pet_reg_anat_file = vat_bids_filepath(suffix='pet',folder='pet',moco='windowed',space='mpr')
-    if 'register' not in skip:
-        register.register_pet(input_reg_image_path=pet_moco_file,
-                            out_image_path=pet_reg_anat_file,
+    if _step_needed('register',skip,force,paths['pet_reg_anat']):
+        register.register_pet(input_reg_image_path=paths['pet_moco'],
+                            out_image_path=paths['pet_reg_anat'],
                             reference_image_path=mprage_file,
-                            motion_target_option=motion_target,
+                            motion_target_option=_MOTION_TARGET,
                             half_life=half_life,
                             verbose=True,
-                            **reg_pars)
-    
-    vat_wm_ref_region_roi_file = vat_bids_filepath(suffix='seg',folder='pet',desc='RefRegionROI')
-    vat_wm_ref_segmentation_file = vat_bids_filepath(suffix='seg',folder='pet',desc='RefRegionSegmentation')
-    if 'refregion' not in skip:
+                            **_REG_PARS)
+
+    def run_refregion():
         segmentation_tools.vat_wm_ref_region(input_segmentation_path=freesurfer_file,
-                                             out_segmentation_path=vat_wm_ref_region_roi_file)
+                                             out_segmentation_path=paths['wm_ref_region_roi'])
         segmentation_tools.vat_wm_region_merge(wmparc_segmentation_path=freesurfer_file,
                                                bs_segmentation_path=brainstem_segmentation_file,
-                                               wm_ref_segmentation_path=vat_wm_ref_region_roi_file,
-                                               out_image_path=vat_wm_ref_segmentation_file)
+                                               wm_ref_segmentation_path=paths['wm_ref_region_roi'],
+                                               out_image_path=paths['wm_ref_segmentation'])
 
-    tac_save_dir = gen_bids_like_dir_path(sub_id=sub_id,ses_id=ses_id,sup_dir=out_dir,modality='tacs')
-    os.makedirs(tac_save_dir,exist_ok=True)
-    tac_prefix = f'{sub}_{ses}'
-    if 'tacs' not in skip:
-        image_operations_4d.write_tacs(input_image_path=pet_reg_anat_file,
-                                       label_map_path=segmentation_label_file,
-                                       segmentation_image_path=vat_wm_ref_segmentation_file,
+    if _step_needed('refregion',skip,force,paths['wm_ref_region_roi'],paths['wm_ref_segmentation']):
+        _run_cached(cache_dir=os.path.join(out_dir, '.cache'),
+                    inputs=(freesurfer_file, brainstem_segmentation_file),
+                    outputs=(paths['wm_ref_region_roi'], paths['wm_ref_segmentation']),
+                    compute=run_refregion)
+
+    if _step_needed('tacs',skip,force,paths['wmref_tac']):
+        image_operations_4d.write_tacs(input_image_path=paths['pet_reg_anat'],
+                                       label_map_path=seg_tsv,
+                                       segmentation_image_path=paths['wm_ref_segmentation'],
                                        out_tac_dir=tac_save_dir,
                                        verbose=True,
                                        out_tac_prefix=tac_prefix,
-                                       time_frame_keyword='FrameTimesStart')
+                                       time_frame_keyword='FrameTimesStart',
+                                       frame_times=frame_timing.start,
+                                       vectorized=vectorized)
 
     # kinetic modeling
-    wmref_tac_path = vat_bids_filepath(suffix='tac',folder='tacs',seg='WMRef',ext='.tsv')
-    mrtm_save_dir = gen_bids_like_dir_path(sub_id=sub_id,ses_id=ses_id,sup_dir=out_dir,modality='mrtm_fits')
-    km_save_dir = gen_bids_like_dir_path(sub_id=sub_id,ses_id=ses_id,sup_dir=out_dir,modality='km')
-    os.makedirs(km_save_dir,exist_ok=True)
-    mrtm_save_path = vat_bids_filepath(suffix='fits',model='mrtm1',folder='km',ext='.tsv')
-    os.makedirs(mrtm_save_dir,exist_ok=True)
-    mrtm1_path = gen_bids_like_filename(sub_id=sub_id,ses_id=ses_id,model='mrtm1',suffix='fits',ext='')
-    if 'mrtm1' not in skip:
-        mrtm1_analysis = rtm_analysis.MultiTACRTMAnalysis(ref_tac_path=wmref_tac_path,
+    def run_mrtm1():
+        mrtm1_analysis = rtm_analysis.MultiTACRTMAnalysis(ref_tac_path=paths['wmref_tac'],
                                                           roi_tacs_dir=tac_save_dir,
                                                           output_directory=mrtm_save_dir,
                                                           output_filename_prefix=mrtm1_path,
                                                           method='mrtm')
-        mrtm1_analysis.run_analysis(t_thresh_in_mins=10)
+        mrtm1_analysis.run_analysis(t_thresh_in_mins=_KM_T_THRESH_IN_MINS)
         mrtm1_analysis.save_analysis()
-        km_regional_fits_to_tsv(fit_results_dir=mrtm_save_dir,out_tsv_dir=mrtm_save_path)
+        km_regional_fits_to_tsv(fit_results_dir=mrtm_save_dir,out_tsv_dir=paths['mrtm1_tsv'])
 
-    logan_save_dir = gen_bids_like_dir_path(sub_id=sub_id,ses_id=ses_id,sup_dir=out_dir,modality='logan_fits')
-    logan_save_path = vat_bids_filepath(suffix='fits',model='altlogan',folder='km',ext='.tsv')
-    os.makedirs(logan_save_dir,exist_ok=True)
-    logan_path = gen_bids_like_filename(sub_id=sub_id,ses_id=ses_id,model='altlogan',suffix='fits',ext='')
-    if 'logan' not in skip:
+    def run_logan():
         graphical_model = graphical_analysis.MultiTACGraphicalAnalysis(
-            input_tac_path=wmref_tac_path,
+            input_tac_path=paths['wmref_tac'],
             roi_tacs_dir=tac_save_dir,
             output_directory=logan_save_dir,
             output_filename_prefix=logan_path,
             method='alt_logan',
-            fit_thresh_in_mins=10
+            fit_thresh_in_mins=_KM_T_THRESH_IN_MINS
         )
         graphical_model.run_analysis()
         graphical_model.save_analysis()
-        km_regional_fits_to_tsv(fit_results_dir=logan_save_dir,out_tsv_dir=logan_save_path)
-
-    # suvr
-    wss_file_path = vat_bids_filepath(suffix='pet',folder='pet',space='mpr',desc='WSS')
-    suvr_file_path = vat_bids_filepath(suffix='pet',folder='pet',space='mpr',desc='SUVR')
-    if 'suvr' not in skip:
-        useful_functions.weighted_series_sum(input_image_4d_path=pet_reg_anat_file,
-                                             half_life=half_life,
-                                             verbose=True,
-                                             start_time=suvr_start,
-                                             end_time=suvr_end,
-                                             out_image_path=wss_file_path)
-        image_operations_4d.suvr(input_image_path=wss_file_path,
-                                 out_image_path=suvr_file_path,
-                                 segmentation_image_path=vat_wm_ref_segmentation_file,
-                                 ref_region=1,
-                                 verbose=True)
-
-    if 'pvc' not in skip:
-        suvr_pvc_path = vat_bids_filepath(suffix='pet',folder='pet',space='mpr',pvc='SGTM',desc='SUVR',ext='.tsv')
-        sgtm.Sgtm(input_image_path=suvr_file_path,
-                  segmentation_image_path=vat_wm_ref_segmentation_file,
-                  fwhm=pvc_fwhm_mm,
-                  out_tsv_path=suvr_pvc_path)
+        km_regional_fits_to_tsv(fit_results_dir=logan_save_dir,out_tsv_dir=paths['logan_tsv'])
+
+    # the two models only share the TACs they read, so they are fit concurrently, and together
+    # with their fit-table aggregation they run in the background while SUVR and PVC are computed
+    km_executor = ThreadPoolExecutor(max_workers=2)
+    km_futures = []
+    if _step_needed('mrtm1',skip,force,paths['mrtm1_tsv']):
+        km_futures.append(km_executor.submit(run_mrtm1))
+    if _step_needed('logan',skip,force,paths['logan_tsv']):
+        km_futures.append(km_executor.submit(run_logan))
+
+    try:
+        # suvr
+        if _step_needed('suvr',skip,force,paths['wss'],paths['suvr']):
+            useful_functions.weighted_series_sum(input_image_4d_path=paths['pet_reg_anat'],
+                                                 half_life=half_life,
+                                                 verbose=True,
+                                                 start_time=_SUVR_START,
+                                                 end_time=_SUVR_END,
+                                                 out_image_path=paths['wss'],
+                                                 image_frame_info=frame_timing)
+            image_operations_4d.suvr(input_image_path=paths['wss'],
+                                     out_image_path=paths['suvr'],
+                                     segmentation_image_path=paths['wm_ref_segmentation'],
+                                     ref_region=1,
+                                     verbose=True)
+
+        if _step_needed('pvc',skip,force,paths['suvr_pvc']):
+            sgtm.Sgtm(input_image_path=paths['suvr'],
+                      segmentation_image_path=paths['wm_ref_segmentation'],
+                      fwhm=_PVC_FWHM_MM,
+                      out_tsv_path=paths['suvr_pvc'])
+    finally:
+        km_executor.shutdown(wait=True)
+    for future in km_futures:
+        future.result()
+
+
+def read_participant_ids(participants_path: str) -> list[str]:
+    """
+    Read the ``participant_id`` column of a BIDS participants.tsv, without parsing the rest of
+    the sheet.
+
+    Args:
+        participants_path (str): Path to participants.tsv.
+
+    Returns:
+        list[str]: Participant IDs in the order they appear in the sheet.
+    """
+    with open(participants_path, newline='') as participants_file:
+        reader = csv.DictReader(participants_file, delimiter='\t')
+        return [row['participant_id'] for row in reader]
+
+
+def load_cohort_map(cohort_map_path: str) -> dict:
+    """
+    Read a JSON file mapping each cohort prefix to its PET and FreeSurfer directories, e.g.
+    ``{"VATDYS": {"pet": "/path/to/pet", "fs": "/path/to/freesurfer"}}``.
+
+    Args:
+        cohort_map_path (str): Path to the JSON file.
+
+    Returns:
+        dict: Map of cohort prefix to a ``(pet_dir, fs_dir)`` pair, as used by
+        :meth:`resolve_dirs`.
+
+    Raises:
+        ValueError: If a cohort entry is missing its 'pet' or 'fs' directory.
+    """
+    with open(cohort_map_path, 'r') as cohort_map_file:
+        cohort_map = json.load(cohort_map_file)
+    cohort_dirs = {}
+    for prefix, dirs in cohort_map.items():
+        try:
+            cohort_dirs[prefix] = (dirs['pet'], dirs['fs'])
+        except KeyError as exc:
+            raise ValueError(f"Cohort {prefix} in {cohort_map_path} must have 'pet' and 'fs' "
+                             "directories.") from exc
+    return cohort_dirs
+
+
+def resolve_dirs(sub: str, cohort_dirs: dict) -> tuple[str, str]:
+    """
+    Get the PET and FreeSurfer directories for a subject from the cohort prefix of its ID.
+
+    Args:
+        sub (str): Subject ID as listed in participants.tsv.
+        cohort_dirs (dict): Map of cohort prefix to a ``(pet_dir, fs_dir)`` pair.
+
+    Returns:
+        tuple[str, str]: The PET and FreeSurfer directories for the subject.
+
+    Raises:
+        ValueError: If the subject ID does not start with any known cohort prefix.
+    """
+    for prefix, dirs in cohort_dirs.items():
+        if sub.startswith(prefix):
+            return dirs
+    raise ValueError(f'Could not determine cohort for subject {sub}')
+
+
+def run_subject(sub: str,
+                cohort_dirs: dict,
+                out_dir: str,
+                skip: list,
+                force: bool=False,
+                keep_intermediates: bool=False,
+                seg_tsv: str=_SEGMENTATION_LABEL_FILE,
+                vectorized: bool=True):
+    """
+    Run :meth:`vat_protocol` on a single subject. Failures are reported rather than raised so
+    that the remaining subjects keep running.
+    """
+    try:
+        pet_dir, fs_dir = resolve_dirs(sub, cohort_dirs)
+        vat_protocol(sub,
+                     out_dir,
+                     pet_dir,
+                     fs_dir,
+                     skip=skip,
+                     force=force,
+                     keep_intermediates=keep_intermediates,
+                     seg_tsv=seg_tsv,
+                     vectorized=vectorized)
+    except Exception:
+        print(f'Running subject {sub} failed; trying next one.')
+
+
+def _init_worker(itk_threads: int):
+    """
+    Initialize a subject worker process. Caps the ITK threads of the worker so that concurrent
+    subjects do not oversubscribe the cores, fixes the ANTs random seed unless one is already set,
+    and imports petpal (and with it ants and ITK) once so that every subject the worker runs reuses
+    the warm runtime.
+    """
+    os.environ['ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS'] = str(itk_threads)
+    os.environ.setdefault('ANTS_RANDOM_SEED', '1')
+    import petpal.preproc
 
 
 def main():
@@ -228,32 +462,62 @@ def main():
                                      epilog=_VAT_EXAMPLE_, formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument('-s','--subjects',required=True,help='Path to participants.tsv')
     parser.add_argument('-o','--out-dir',required=True,help='Output directory analyses are saved to.')
-    parser.add_argument('--vatdys-pet',required=True,help='Path to BIDS directory storing VATDYS PET')
-    parser.add_argument('--vatdys-fs',required=True,help='Path to directory storing VATDYS FreeSurfer')
-    parser.add_argument('--vatnl-pet',required=True,help='Path to BIDS directory storing VATNL PET')
-    parser.add_argument('--vatnl-fs',required=True,help='Path to directory storing VATNL FreeSurfer')
-    parser.add_argument('--pib-pet',required=True,help='Path to BIDS directory storing PIB PET')
-    parser.add_argument('--pib-fs',required=True,help='Path to directory storing PIB FreeSurfer')
+    parser.add_argument('--vatdys-pet',required=False,help='Path to BIDS directory storing VATDYS PET')
+    parser.add_argument('--vatdys-fs',required=False,help='Path to directory storing VATDYS FreeSurfer')
+    parser.add_argument('--vatnl-pet',required=False,help='Path to BIDS directory storing VATNL PET')
+    parser.add_argument('--vatnl-fs',required=False,help='Path to directory storing VATNL FreeSurfer')
+    parser.add_argument('--pib-pet',required=False,help='Path to BIDS directory storing PIB PET')
+    parser.add_argument('--pib-fs',required=False,help='Path to directory storing PIB FreeSurfer')
+    parser.add_argument('--cohort-map',required=False,
+                        help='JSON file mapping cohort prefixes to their PET and FreeSurfer directories.\n'
+                             'Entries override the per-cohort directory flags.')
+    parser.add_argument('--dseg-tsv',required=False,default=_SEGMENTATION_LABEL_FILE,
+                        help='Path to the segmentation label map TSV used to write TACs.')
 
     parser.add_argument('--skip',required=False,help='List of steps to skip',nargs='+',default=[])
+    parser.add_argument('--force',required=False,action='store_true',default=False,
+                        help='Rerun steps even if their outputs already exist.')
+    parser.add_argument('--keep-intermediates',required=False,action='store_true',default=False,
+                        help='Write the cropped PET to disk instead of passing it to motion correction\n'
+                             'in memory.')
+    parser.add_argument('--per-region-tacs',required=False,action='store_true',default=False,
+                        help='Compute regional TACs with one pass over the image per region instead of\n'
+                             'all regions in one pass.')
+    parser.add_argument('-j','--jobs',required=False,type=int,default=1,
+                        help='Number of subjects to process in parallel.')
+    parser.add_argument('--threads-per-job',required=False,type=int,default=None,
+                        help='Number of ITK threads each subject may use. Defaults to the number of CPUs\n'
+                             'divided by --jobs.')
     args = parser.parse_args()
 
 
-    subs_sheet = pd.read_csv(args.subjects,sep='\t')
-    subs = subs_sheet['participant_id']
+    subs = read_participant_ids(args.subjects)
 
-    for sub in subs:
-        if sub[:6]=='VATDYS':
-            pet_dir = args.vatdys_pet
-            fs_dir = args.vatdys_fs
-        elif sub[:5]=='VATNL':
-            pet_dir = args.vatnl_pet
-            fs_dir = args.vatnl_fs
-        elif sub[:3]=='PIB':
-            pet_dir = args.pib_pet
-            fs_dir = args.pib_fs
-        try:
-            vat_protocol(sub,args.out_dir,pet_dir,fs_dir,skip=args.skip)
-        except:
-            print(f'Running subject {sub} failed; trying next one.')
-main()
+    cohort_dirs = {prefix: dirs for prefix, dirs in (('VATDYS', (args.vatdys_pet, args.vatdys_fs)),
+                                                     ('VATNL', (args.vatnl_pet, args.vatnl_fs)),
+                                                     ('PIB', (args.pib_pet, args.pib_fs)))
+                   if all(dirs)}
+    if args.cohort_map is not None:
+        cohort_dirs.update(load_cohort_map(args.cohort_map))
+    if not cohort_dirs:
+        parser.error('Provide --cohort-map or the PET and FreeSurfer directories of at least one cohort.')
+
+    itk_threads = args.threads_per_job or max(1, (os.cpu_count() or 1) // args.jobs)
+    with ProcessPoolExecutor(max_workers=args.jobs,
+                             initializer=_init_worker,
+                             initargs=(itk_threads,)) as executor:
+        futures = [executor.submit(run_subject,
+                                   sub,
+                                   cohort_dirs,
+                                   args.out_dir,
+                                   args.skip,
+                                   args.force,
+                                   args.keep_intermediates,
+                                   args.dseg_tsv,
+                                   not args.per_region_tacs) for sub in subs]
+        for future in futures:
+            future.result()
+
+
+if __name__ == '__main__':
+    main()
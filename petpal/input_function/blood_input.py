@@ -1,4 +1,7 @@
+import os
+import functools
 from typing import Tuple
+import numba
 import numpy as np
 from pandas import read_csv
 from scipy.interpolate import interp1d as sp_interp
@@ -134,6 +137,87 @@ class BloodInputFunction(object):
         return fitted_line_function
 
 
+@numba.njit()
+def _resample_kernel(t_src: np.ndarray,
+                     c_src: np.ndarray,
+                     t_dst: np.ndarray,
+                     lin_fit_thresh: float,
+                     slope: float,
+                     intercept: float) -> np.ndarray:
+    r"""
+    Evaluates the piecewise blood input function on new times.
+
+    Below ``lin_fit_thresh`` the samples ``(t_src, c_src)`` are linearly interpolated, extrapolating with the first
+    and last segments outside the sampled range. At or above ``lin_fit_thresh`` the fitted line
+    ``slope * t + intercept`` is used. Negative values are clipped to zero. This mirrors
+    :meth:`BloodInputFunction.calc_blood_input_function`.
+
+    Args:
+        t_src (np.ndarray): Sorted sample times below the threshold, in minutes. Needs at least 2 samples.
+        c_src (np.ndarray): Activity corresponding to ``t_src``.
+        t_dst (np.ndarray): Times at which to evaluate the input function, in minutes.
+        lin_fit_thresh (float): Threshold time, in minutes, between interpolation and the linear fit.
+        slope (float): Slope of the linear fit above the threshold.
+        intercept (float): Intercept of the linear fit above the threshold.
+
+    Returns:
+        np.ndarray: Blood input function values at ``t_dst``.
+    """
+    num_src = t_src.shape[0]
+    c_dst = np.zeros(t_dst.shape[0], dtype=np.float64)
+    for i in range(t_dst.shape[0]):
+        t = t_dst[i]
+        if t >= lin_fit_thresh:
+            val = slope * t + intercept
+        else:
+            lo = 0
+            hi = num_src - 1
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if t_src[mid] <= t:
+                    lo = mid
+                else:
+                    hi = mid
+            val = c_src[lo] + (c_src[hi] - c_src[lo]) * (t - t_src[lo]) / (t_src[hi] - t_src[lo])
+        if val > 0.0:
+            c_dst[i] = val
+    return c_dst
+
+
+@functools.lru_cache(maxsize=32)
+def _load_and_fit_blood(blood_tac_path: str,
+                        mtime_ns: int,
+                        lin_fit_thresh_in_mins: float,
+                        rescale_constant: float) -> Tuple[np.ndarray, np.ndarray, float, float]:
+    r"""
+    Loads a raw blood TAC, rescales it, and fits a line to the samples at or above the threshold.
+
+    Results are memoized so that resampling the same blood TAC onto the frame times of several PET
+    images only reads and fits it once. ``mtime_ns`` is part of the cache key so that a modified
+    file is re-read.
+
+    Args:
+        blood_tac_path (str): Path to the file containing raw blood time-activity data.
+        mtime_ns (int): Modification time of ``blood_tac_path`` in nanoseconds.
+        lin_fit_thresh_in_mins (float): Threshold in minutes for piecewise linear fit.
+        rescale_constant (float): Constant to rescale the blood TAC data.
+
+    Returns:
+        tuple: The (read-only) rescaled sample times and activity below the threshold, and the
+        slope and intercept of the line fit above the threshold.
+    """
+    blood_times, blood_activity = image_io.safe_load_tac(filename=blood_tac_path)
+    blood_activity = blood_activity * rescale_constant
+    above_thresh = blood_times >= lin_fit_thresh_in_mins
+    assert np.sum(above_thresh) >= 3, "Need at least 3 data-points above `thresh` to fit a line"
+    slope, intercept = np.polyfit(blood_times[above_thresh], blood_activity[above_thresh], deg=1)
+    below_times = np.ascontiguousarray(blood_times[~above_thresh], dtype=np.float64)
+    below_activity = np.ascontiguousarray(blood_activity[~above_thresh], dtype=np.float64)
+    below_times.setflags(write=False)
+    below_activity.setflags(write=False)
+    return below_times, below_activity, float(slope), float(intercept)
+
+
 def resample_blood_data_on_scanner_times(blood_tac_path: str,
                                          out_tac_path: str,
                                          reference_4dpet_img_path: str,
@@ -177,10 +261,14 @@ def resample_blood_data_on_scanner_times(blood_tac_path: str,
     assert rescale_constant > 0.0, "Rescale constant must be greater than zero."
     image_meta_data = image_io.load_metadata_for_nifti_with_same_filename(image_path=reference_4dpet_img_path)
     frame_times = np.asarray(image_meta_data['FrameReferenceTime']) / 60.0
-    blood_times, blood_activity = image_io.safe_load_tac(filename=blood_tac_path)
-    blood_intp = BloodInputFunction(time=blood_times, activity=blood_activity, thresh_in_mins=lin_fit_thresh_in_mins)
-    resampled_blood = blood_intp.calc_blood_input_function(t=frame_times)
-    resampled_blood *= rescale_constant
+    below_times, below_activity, slope, intercept = _load_and_fit_blood(
+        blood_tac_path=os.path.abspath(blood_tac_path),
+        mtime_ns=os.stat(blood_tac_path).st_mtime_ns,
+        lin_fit_thresh_in_mins=float(lin_fit_thresh_in_mins),
+        rescale_constant=float(rescale_constant))
+    resampled_blood = _resample_kernel(below_times, below_activity,
+                                       np.ascontiguousarray(frame_times, dtype=np.float64),
+                                       float(lin_fit_thresh_in_mins), slope, intercept)
     resampled_tac = np.asarray([frame_times, resampled_blood], dtype=float)
     
     np.savetxt(X=resampled_tac.T, fname=out_tac_path, header="time(mins)\tactivity", comments='')
@@ -1,16 +1,49 @@
+import os
 import warnings
-import copy
+import importlib
 from typing import Union
 from .steps_base import *
-from ..preproc.image_operations_4d import SimpleAutoImageCropper, write_tacs
-from ..preproc.register import register_pet
-from ..preproc.motion_corr import (motion_corr_frames_above_mean_value,
-                                   windowed_motion_corr_to_target)
-from ..input_function import blood_input
+from .steps_base import _submit_meta_task, _await_meta
 from ..utils.bids_utils import parse_path_to_get_subject_and_session_id, snake_to_camel_case, gen_bids_like_dir_path, gen_bids_like_filepath
-from ..utils.image_io import safe_copy_meta
+from ..utils.image_io import safe_copy_meta, gen_meta_data_filepath_for_nifti
 
-class TACsFromSegmentationStep(FunctionBasedStep):
+# The processing functions wrapped by the steps below pull in ANTs and friends, so they are only
+# imported when a step that uses them is created. They remain reachable as module attributes.
+_LAZY_ATTRS = {'SimpleAutoImageCropper': ('..preproc.image_operations_4d', 'SimpleAutoImageCropper'),
+               'write_tacs': ('..preproc.image_operations_4d', 'write_tacs'),
+               'register_pet': ('..preproc.register', 'register_pet'),
+               'motion_corr_frames_above_mean_value': ('..preproc.motion_corr', 'motion_corr_frames_above_mean_value'),
+               'windowed_motion_corr_to_target': ('..preproc.motion_corr', 'windowed_motion_corr_to_target'),
+               'blood_input': ('..input_function', 'blood_input'), }
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module_name, attr_name = _LAZY_ATTRS[name]
+        return getattr(importlib.import_module(module_name, __package__), attr_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _CachedReprMixin:
+    """
+    Caches the string built by ``_build_repr`` so that repeated ``repr()`` calls, e.g. when logging
+    steps, do not rebuild it. Any attribute assignment, including through property setters,
+    clears the cache. The ``repr`` must therefore only depend on instance attributes.
+    """
+    def __setattr__(self, name, value):
+        if name != '_repr_cache':
+            super().__setattr__('_repr_cache', None)
+        super().__setattr__(name, value)
+    
+    def __repr__(self):
+        repr_str = self.__dict__.get('_repr_cache')
+        if repr_str is None:
+            repr_str = self._build_repr()
+            super().__setattr__('_repr_cache', repr_str)
+        return repr_str
+
+
+class TACsFromSegmentationStep(_CachedReprMixin, FunctionBasedStep):
     """
     A step in a processing pipeline for generating Time Activity Curves (TACs) from segmented images.
 
@@ -27,6 +60,7 @@ class TACsFromSegmentationStep(FunctionBasedStep):
         out_tacs_prefix (str): Prefix for the output TACs.
         time_keyword (str): Keyword for the time frame, default is 'FrameReferenceTime'.
         verbose (bool): Verbosity flag, default is False.
+        z_tile (int | None): Number of slices read at a time when computing the TACs, default is None.
 
     """
     def __init__(self,
@@ -36,7 +70,8 @@ class TACsFromSegmentationStep(FunctionBasedStep):
                  out_tacs_dir: str,
                  out_tacs_prefix: str,
                  time_keyword='FrameReferenceTime',
-                 verbose=False) -> None:
+                 verbose=False,
+                 z_tile: int | None = None) -> None:
         """
         Initializes a TACsFromSegmentationStep with specified parameters.
 
@@ -48,11 +83,15 @@ class TACsFromSegmentationStep(FunctionBasedStep):
             out_tacs_prefix (str): Prefix for the output TACs.
             time_keyword (str): Keyword for the time frame, default is 'FrameReferenceTime'.
             verbose (bool): Verbosity flag, default is False.
+            z_tile (int | None): Number of slices of the input image read at a time when computing the
+                TACs, which caps memory use for large uncompressed 4D images. If None, the whole image is
+                loaded. Default is None. See :func:`write_tacs<petpal.preproc.image_operations_4d.write_tacs>`.
         """
+        from ..preproc.image_operations_4d import write_tacs
         super().__init__(name='write_roi_tacs', function=write_tacs, input_image_path=input_image_path,
                          segmentation_image_path=segmentation_image_path, label_map_path=segmentation_label_map_path,
                          out_tac_dir=out_tacs_dir, out_tac_prefix=out_tacs_prefix, time_frame_keyword=time_keyword,
-                         verbose=verbose, )
+                         verbose=verbose, z_tile=z_tile, )
         self._input_image = input_image_path
         self._segmentation_image = segmentation_image_path
         self._segmentation_label_map = segmentation_label_map_path
@@ -60,8 +99,9 @@ class TACsFromSegmentationStep(FunctionBasedStep):
         self._out_tacs_prefix = out_tacs_prefix
         self.time_keyword = time_keyword
         self.verbose = verbose
+        self.z_tile = z_tile
     
-    def __repr__(self):
+    def _build_repr(self):
         """
         Provides an unambiguous string representation of the TACsFromSegmentationStep instance.
 
@@ -69,18 +109,16 @@ class TACsFromSegmentationStep(FunctionBasedStep):
             str: A string representation showing how the instance can be recreated.
         """
         cls_name = type(self).__name__
-        info_str = [f'{cls_name}(']
-        
-        in_kwargs = ArgsDict(
-            dict(input_image_path=self.input_image_path, segmentation_image_path=self.segmentation_image_path,
-                 segmentation_label_map_path=self.segmentation_label_map_path, out_tacs_dir=self.out_tacs_dir,
-                 out_tacs_prefix=self.out_tacs_prefix, time_keyword=self.time_keyword, verbose=self.verbose))
+        in_kwargs = (('input_image_path', self.input_image_path),
+                     ('segmentation_image_path', self.segmentation_image_path),
+                     ('segmentation_label_map_path', self.segmentation_label_map_path),
+                     ('out_tacs_dir', self.out_tacs_dir),
+                     ('out_tacs_prefix', self.out_tacs_prefix),
+                     ('time_keyword', self.time_keyword),
+                     ('verbose', self.verbose),
+                     ('z_tile', self.z_tile))
         
-        for arg_name, arg_val in in_kwargs.items():
-            info_str.append(f'{arg_name}={repr(arg_val)},')
-        info_str.append(')')
-        
-        return f'\n    '.join(info_str)
+        return f'{cls_name}(\n    ' + '\n    '.join(f'{k}={v!r},' for k, v in in_kwargs) + '\n    )'
     
     @property
     def segmentation_image_path(self):
@@ -268,7 +306,7 @@ class TACsFromSegmentationStep(FunctionBasedStep):
             return cls(**defaults)
     
 
-class ResampleBloodTACStep(FunctionBasedStep):
+class ResampleBloodTACStep(_CachedReprMixin, FunctionBasedStep):
     """
     A step in a processing pipeline for resampling blood Time Activity Curves (TACs) based on PET image timings.
 
@@ -299,6 +337,7 @@ class ResampleBloodTACStep(FunctionBasedStep):
             out_tac_path (str): Path where the resampled TAC will be saved.
             lin_fit_thresh_in_mins (float): Threshold in minutes for linear fitting.
         """
+        from ..input_function import blood_input
         super().__init__(name='resample_PTAC_on_scanner',
                          function=blood_input.resample_blood_data_on_scanner_times,
                          blood_tac_path=input_raw_blood_tac_path,
@@ -312,7 +351,7 @@ class ResampleBloodTACStep(FunctionBasedStep):
         self.lin_fit_thresh_in_mins = lin_fit_thresh_in_mins
         self.rescale_constant = rescale_constant
     
-    def __repr__(self):
+    def _build_repr(self):
         """
         Provides an unambiguous string representation of the ResampleBloodTACStep instance.
 
@@ -320,17 +359,12 @@ class ResampleBloodTACStep(FunctionBasedStep):
             str: A string representation showing how the instance can be recreated.
         """
         cls_name = type(self).__name__
-        info_str = [f'{cls_name}(']
+        in_kwargs = (('input_raw_blood_tac_path', self.raw_blood_tac_path),
+                     ('input_image_path', self.input_image_path),
+                     ('out_tac_path', self.resampled_tac_path),
+                     ('lin_fit_thresh_in_mins', self.lin_fit_thresh_in_mins))
         
-        in_kwargs = ArgsDict(
-                dict(input_raw_blood_tac_path=self.raw_blood_tac_path, input_image_path=self.input_image_path,
-                     out_tac_path=self.resampled_tac_path, lin_fit_thresh_in_mins=self.lin_fit_thresh_in_mins))
-        
-        for arg_name, arg_val in in_kwargs.items():
-            info_str.append(f'{arg_name}={repr(arg_val)},')
-        info_str.append(')')
-        
-        return f'\n    '.join(info_str)
+        return f'{cls_name}(\n    ' + '\n    '.join(f'{k}={v!r},' for k, v in in_kwargs) + '\n    )'
     
     @property
     def raw_blood_tac_path(self):
@@ -452,6 +486,11 @@ class ImageToImageStep(FunctionBasedStep):
     Attributes:
         input_image_path (str): Path to the input image file.
         output_image_path (str): Path to the output image file.
+    
+    Note:
+        For compressed images on network-mounted storage, the read chunk size used when loading
+        ``.nii.gz`` files can be tuned with the ``PETPAL_IO_BUFFER`` environment variable (in bytes). See
+        :func:`petpal.utils.image_io._configure_io_buffer`.
         
     See Also:
         - :meth:`default_threshold_cropping`
@@ -485,27 +524,47 @@ class ImageToImageStep(FunctionBasedStep):
         
         """
         super().__init__(name, function, *(input_image_path, output_image_path, *args), **kwargs)
-        self.input_image_path = copy.copy(self.args[0])
-        self.output_image_path = copy.copy(self.args[1])
+        self.input_image_path = self.args[0]
+        self.output_image_path = self.args[1]
         self.args = self.args[2:]
     
-    def execute(self, copy_meta_file: bool = True) -> None:
+    def execute(self, copy_meta_file: bool = True, use_cache: bool = False) -> None:
         """
         Executes the function and optionally copies meta-data information using
         :func:`safe_copy_meta<petpal.utils.image_io.safe_copy_meta>`.
 
         Args:
             copy_meta_file (bool): Whether to copy meta information from input to output image. Defaults to True.
+                The copy is written in the background; later steps reading the output image wait for it.
+            use_cache (bool): Whether to reuse the output of a previous run with the same function, arguments
+                and unchanged input files, instead of running the function. Outputs are cached in
+                ``~/.cache/petpal``, or in the directory set by the ``PETPAL_CACHE_DIR`` environment variable.
+                Defaults to False.
             
         Notes:
             Function must have the following arguments order: ``(input_image_path, output_image_path, *args, **kwargs)``
             where ``input_image`` and ``output_image`` are abritrary names.
             
         """
+        _await_meta(self.input_image_path, *self.args, *self.kwargs.values())
         print(f"(Info): Executing {self.name}")
-        self.function(self.input_image_path, self.output_image_path, *self.args, **self.kwargs)
+        cache_key = None
+        if use_cache:
+            # the sidecar is an input too: timing-based functions read it
+            input_meta_path = gen_meta_data_filepath_for_nifti(self.input_image_path)
+            cache_inputs = [self.input_image_path]
+            if os.path.isfile(input_meta_path):
+                cache_inputs.append(input_meta_path)
+            cache_key = self._cache_key(*cache_inputs)
+        if cache_key is not None and self._restore_from_cache(cache_key, self.output_image_path):
+            print(f"(Info): Reused cached output for {self.name}")
+        else:
+            self.function(self.input_image_path, self.output_image_path, *self.args, **self.kwargs)
+            if cache_key is not None:
+                self._store_in_cache(cache_key, self.output_image_path)
         if copy_meta_file:
-            safe_copy_meta(input_image_path=self.input_image_path, out_image_path=self.output_image_path)
+            _submit_meta_task(self.output_image_path, safe_copy_meta,
+                              input_image_path=self.input_image_path, out_image_path=self.output_image_path)
         print(f"(Info): Finished {self.name}")
     
     def __str__(self):
@@ -586,6 +645,7 @@ class ImageToImageStep(FunctionBasedStep):
         Returns:
             ImageToImageStep: A new instance for threshold cropping.
         """
+        from ..preproc.image_operations_4d import SimpleAutoImageCropper
         defaults = dict(name='thresh_crop', function=SimpleAutoImageCropper, input_image_path='',
                         output_image_path='', )
         override_dict = defaults | overrides
@@ -609,6 +669,7 @@ class ImageToImageStep(FunctionBasedStep):
         Returns:
             ImageToImageStep: A new instance for motion correction frames above mean value.
         """
+        from ..preproc.motion_corr import motion_corr_frames_above_mean_value
         defaults = dict(name='moco_frames_above_mean', function=motion_corr_frames_above_mean_value,
                         input_image_path='', output_image_path='', motion_target_option='mean_image', verbose=verbose,
                         half_life=None, )
@@ -633,6 +694,7 @@ class ImageToImageStep(FunctionBasedStep):
         Returns:
             ImageToImageStep: A new instance for windowed motion correction of frames.
         """
+        from ..preproc.motion_corr import windowed_motion_corr_to_target
         defaults = dict(name='windowed_moco', function=windowed_motion_corr_to_target,
                         input_image_path='', output_image_path='',
                         motion_target_option='weighted_series_sum', w_size=60.0,
@@ -661,6 +723,7 @@ class ImageToImageStep(FunctionBasedStep):
             ImageToImageStep: A new instance for registering PET to T1 image.
 
         """
+        from ..preproc.register import register_pet
         defaults = dict(name='register_pet_to_t1', function=register_pet, input_image_path='', output_image_path='',
                         reference_image_path=reference_image_path, motion_target_option='weighted_series_sum',
                         verbose=verbose, half_life=half_life)
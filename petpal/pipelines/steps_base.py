@@ -1,5 +1,62 @@
+import os
+import shutil
+import hashlib
 import inspect
+import threading
 from typing import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_STEP_CACHE_DIR = os.environ.get('PETPAL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'petpal'))
+
+_META_POOL: ThreadPoolExecutor | None = None
+_PENDING_META: dict[str, Future] = {}
+_PENDING_META_LOCK = threading.Lock()
+
+
+def _reset_meta_state() -> None:
+    """
+    Drops the metadata pool and pending writes inherited by a forked child process. The threads of
+    the parent's pool do not exist in the child, so waiting on its futures would block forever.
+    """
+    global _META_POOL, _PENDING_META, _PENDING_META_LOCK
+    _META_POOL = None
+    _PENDING_META = {}
+    _PENDING_META_LOCK = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_meta_state)
+
+
+def _submit_meta_task(out_image_path: str, meta_func: Callable, /, **kwargs) -> None:
+    """
+    Runs ``meta_func(**kwargs)``, which writes the metadata of ``out_image_path``, in the
+    background. Steps that take ``out_image_path`` as an input wait for it with
+    :func:`_await_meta` before they run. The pool is created on first use, once per process.
+    """
+    global _META_POOL
+    with _PENDING_META_LOCK:
+        if _META_POOL is None:
+            _META_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='petpal-meta')
+    future = _META_POOL.submit(meta_func, **kwargs)
+    with _PENDING_META_LOCK:
+        _PENDING_META[out_image_path] = future
+
+
+def _await_meta(*image_paths) -> None:
+    """
+    Waits for background metadata writes for the given image paths, or for all of them if no
+    paths are given, and re-raises any error they raised.
+    """
+    with _PENDING_META_LOCK:
+        if image_paths:
+            futures = [_PENDING_META.pop(path) for path in image_paths
+                       if isinstance(path, str) and path in _PENDING_META]
+        else:
+            futures = list(_PENDING_META.values())
+            _PENDING_META.clear()
+    for future in futures:
+        future.result()
 
 
 class ArgsDict(dict):
@@ -156,10 +213,57 @@ class FunctionBasedStep(StepsAPI):
         Raises:
             The function may raise any exceptions that its implementation can throw.
         """
+        _await_meta(*self.args, *self.kwargs.values())
         print(f"(Info): Executing {self.name}")
         self.function(*self.args, **self.kwargs)
         print(f"(Info): Finished {self.name}")
     
+    def _cache_key(self, *input_paths: str) -> str:
+        """
+        Hashes everything that determines the output of this step: the function, the arguments and
+        keyword arguments, and the path, modification time and size of the input files. Input files
+        are the given ``input_paths`` and any keyword argument whose name ends in ``_path`` and
+        points to an existing file.
+
+        Args:
+            *input_paths (str): Paths to input files that are not keyword arguments of the step.
+
+        Returns:
+            str: Hex digest identifying the outputs of this step.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f'{self.function.__module__}.{self.function.__qualname__}'.encode())
+        digest.update(repr(self.args).encode())
+        digest.update(repr(ArgsDict(sorted(self.kwargs.items()))).encode())
+        kwarg_paths = [arg_val for arg_name, arg_val in sorted(self.kwargs.items())
+                       if arg_name.endswith('_path') and isinstance(arg_val, str) and os.path.isfile(arg_val)]
+        for path in (*input_paths, *kwarg_paths):
+            path_stat = os.stat(path)
+            digest.update(f'{os.path.abspath(path)}|{path_stat.st_mtime_ns}|{path_stat.st_size}'.encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _restore_from_cache(cache_key: str, out_path: str) -> bool:
+        """
+        Copies the cached output for ``cache_key`` to ``out_path``, if there is one.
+
+        Returns:
+            bool: True if the output was restored from the cache, False otherwise.
+        """
+        cached_path = os.path.join(_STEP_CACHE_DIR, f'{cache_key}_{os.path.basename(out_path)}')
+        if not os.path.isfile(cached_path):
+            return False
+        shutil.copy2(cached_path, out_path)
+        return True
+
+    @staticmethod
+    def _store_in_cache(cache_key: str, out_path: str) -> None:
+        """
+        Stores a copy of the output at ``out_path`` in the cache under ``cache_key``.
+        """
+        os.makedirs(_STEP_CACHE_DIR, exist_ok=True)
+        shutil.copy2(out_path, os.path.join(_STEP_CACHE_DIR, f'{cache_key}_{os.path.basename(out_path)}'))
+
     def generate_kwargs_from_args(self) -> ArgsDict:
         """
         Converts positional arguments into keyword arguments.
@@ -349,6 +453,7 @@ class ObjectBasedStep(StepsAPI):
         Raises:
             The function may raise any exceptions that its implementation can throw.
         """
+        _await_meta(*self.init_kwargs.values(), *self.call_kwargs.values())
         print(f"(Info): Executing {self.name}")
         obj_instance = self.class_type(**self.init_kwargs)
         obj_instance(**self.call_kwargs)
@@ -1,13 +1,27 @@
 import copy
+import multiprocessing
 from typing import Union
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import networkx as nx
 from matplotlib import pyplot as plt
 from .steps_base import *
+from .steps_base import _await_meta
 from .preproc_steps import PreprocStepType, ImageToImageStep, TACsFromSegmentationStep, ResampleBloodTACStep
 from .kinetic_modeling_steps import KMStepType, GraphicalAnalysisStep, TCMFittingAnalysisStep, ParametricGraphicalAnalysisStep
 
 StepType = Union[FunctionBasedStep, ObjectBasedStep, PreprocStepType, KMStepType]
 
+
+def _execute_step(step: StepType) -> None:
+    """
+    Executes a single step. Module-level so that it can be sent to worker processes by
+    :meth:`StepsPipeline.execute_parallel`. Waits for the metadata of the step's outputs so that
+    they are complete once the worker reports the step as done.
+    """
+    step.execute()
+    _await_meta()
+
+
 class StepsContainer:
     """
     A container for managing and executing a sequence of steps in a pipeline.
@@ -138,6 +152,7 @@ class StepsContainer:
         """
         for step_id, (step_name, a_step) in enumerate(zip(self.step_names, self.step_objs)):
             a_step.execute()
+        _await_meta()
     
     def __getitem__(self, step: Union[int, str]):
         """
@@ -434,6 +449,49 @@ class StepsPipeline:
         for step_name in nx.topological_sort(self.dependency_graph):
             step = self.get_step_from_node_label(node_label=step_name)
             step.execute()
+        _await_meta()
+    
+    def execute_parallel(self, max_workers: Union[int, None] = None):
+        """
+        Executes all steps in the pipeline, running steps that do not depend on each other
+        concurrently in separate processes.
+
+        A step is submitted as soon as all the steps it depends on in :attr:`dependency_graph`
+        have finished, so independent branches of the pipeline (e.g. resampling the blood TAC and
+        registering the PET) overlap. Each step runs on a copy of the step object in a worker
+        process, so steps must communicate through their output files, as they already do.
+
+        Workers are started with the ``'spawn'`` method rather than forked, so they do not inherit
+        the background metadata writer of this process. Metadata writes still pending here are
+        finished before any worker starts.
+
+        Args:
+            max_workers (Union[int, None]): Maximum number of steps to run at once. Defaults to the
+                number of CPUs.
+
+        Raises:
+            The first exception raised by a step, after the steps already running have finished.
+        """
+        _await_meta()
+        graph = self.dependency_graph
+        pending_deps = {step_name: graph.in_degree(step_name) for step_name in graph.nodes}
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            def submit(step_name):
+                step = self.get_step_from_node_label(node_label=step_name)
+                return executor.submit(_execute_step, step)
+            
+            running = {submit(step_name): step_name for step_name, num_deps in pending_deps.items()
+                       if num_deps == 0}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_name = running.pop(future)
+                    future.result()
+                    for next_step_name in graph.successors(step_name):
+                        pending_deps[next_step_name] -= 1
+                        if pending_deps[next_step_name] == 0:
+                            running[submit(next_step_name)] = next_step_name
     
     def add_step(self, container_name: str, step: StepType):
         """
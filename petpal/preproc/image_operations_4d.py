@@ -28,6 +28,7 @@ import datetime
 import tempfile
 import ants
 import nibabel
+import numba
 import numpy as np
 from scipy.ndimage import center_of_mass
 
@@ -174,6 +175,9 @@ def crop_image(input_image_path: str,
     return cropped_image
 
 
+_MOTION_TARGET_CACHE: dict[tuple, str] = {}
+
+
 def determine_motion_target(motion_target_option: str | tuple | list,
                             input_image_4d_path: str = None,
                             half_life: float = None) -> str:
@@ -216,6 +220,45 @@ def determine_motion_target(motion_target_option: str | tuple | list,
         ValueError: If ``motion_target_option`` does not match an acceptable option, or if 
         ``half_life`` is not specifiedwhen ``motion_target_option`` is not 'mean_image'
         TypeError: If start and end time are incompatible with ``float`` type.
+
+    Note:
+        Computed targets are memoized per input image (path, size and modification time), option
+        and half life, so that e.g. motion correction and registration of the same image share a
+        single weighted series sum. A memoized target is reused only while its file still exists.
+    """
+    if motion_target_option != 'mean_image' and half_life is None:
+        raise ValueError('half_life must be specified if not using "mean_image" for motion_target_option')
+
+    if isinstance(motion_target_option, str) and os.path.exists(motion_target_option):
+        return motion_target_option
+
+    try:
+        image_stat = os.stat(input_image_4d_path)
+        option_key = tuple(motion_target_option) if isinstance(motion_target_option, list) else motion_target_option
+        cache_key = (os.path.abspath(input_image_4d_path), image_stat.st_size, image_stat.st_mtime_ns,
+                     option_key, half_life)
+        hash(cache_key)
+    except (TypeError, OSError):
+        cache_key = None
+
+    if cache_key is not None:
+        cached_target = _MOTION_TARGET_CACHE.get(cache_key)
+        if cached_target is not None and os.path.exists(cached_target):
+            return cached_target
+
+    out_image_file = _compute_motion_target(motion_target_option=motion_target_option,
+                                            input_image_4d_path=input_image_4d_path,
+                                            half_life=half_life)
+    if cache_key is not None:
+        _MOTION_TARGET_CACHE[cache_key] = out_image_file
+    return out_image_file
+
+
+def _compute_motion_target(motion_target_option: str | tuple | list,
+                           input_image_4d_path: str = None,
+                           half_life: float = None) -> str:
+    """
+    Computes the motion target for :func:`determine_motion_target`, without memoization.
     """
     if motion_target_option != 'mean_image' and half_life is None:
         raise ValueError('half_life must be specified if not using "mean_image" for motion_target_option')
@@ -361,6 +404,102 @@ def extract_mean_roi_tac_from_nifti_using_segmentation(input_image_4d_numpy: np.
     return tac_out
 
 
+def extract_mean_roi_tacs_from_nifti_using_segmentation(input_image_4d_numpy: np.ndarray,
+                                                        segmentation_image_numpy: np.ndarray,
+                                                        regions: list[int]) -> np.ndarray:
+    """
+    Vectorized counterpart of :meth:`extract_mean_roi_tac_from_nifti_using_segmentation` that
+    computes the TACs of many regions at once.
+
+    Instead of masking the PET image once per region, the voxels of each frame are summed per
+    label in a single pass, with frames handled in parallel, and divided by the voxel count of
+    each label.
+    As in the single-region function, a voxel belongs to a region if its segmentation value is
+    within 0.1 of the region value.
+
+    Args:
+        input_image_4d_numpy (np.ndarray): 4D PET image series, registered to anatomical space.
+        segmentation_image_numpy (np.ndarray): 3D segmentation image, where integer indices label
+            specific regions. Must have same sampling as PET input.
+        regions (list[int]): Values in the segmentation image corresponding to the regions over
+            which TACs are computed.
+
+    Returns:
+        tacs_out (np.ndarray): Mean of PET image within each region for each frame, with shape
+            ``(len(regions), num_frames)``. Regions with no voxels are NaN.
+
+    Raises:
+        ValueError: If the segmentation image and PET image have different
+            sampling.
+    """
+    pet_image_4d = input_image_4d_numpy
+    if len(pet_image_4d.shape)==3:
+        pet_image_4d = pet_image_4d[..., np.newaxis]
+    num_frames = pet_image_4d.shape[3]
+    seg_image = segmentation_image_numpy
+
+    if seg_image.shape[:3]!=pet_image_4d.shape[:3]:
+        raise ValueError('Mis-match in image shape of segmentation image '
+                         f'({seg_image.shape}) and PET image '
+                         f'({pet_image_4d.shape[:3]}). Consider resampling '
+                         'segmentation to PET or vice versa.')
+
+    label_sums, label_counts = _sum_pet_by_label(pet_image_4d=pet_image_4d,
+                                                 seg_image=seg_image,
+                                                 regions=regions)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tacs_out = label_sums / label_counts[:, np.newaxis]
+    return tacs_out
+
+
+@numba.njit(parallel=True)
+def _label_sums_kernel(pet_image_4d: np.ndarray,
+                       x_inds: np.ndarray,
+                       y_inds: np.ndarray,
+                       z_inds: np.ndarray,
+                       flat_labels: np.ndarray,
+                       num_labels: int) -> np.ndarray:
+    """
+    Sums the frames of a 4D PET image over the labelled voxels ``(x_inds, y_inds, z_inds)`` per
+    label in ``flat_labels``. Frames are split across threads, so each thread only writes to its
+    own column of the output and no reduction between threads is needed. Sums are accumulated in
+    float64.
+
+    Returns:
+        np.ndarray: The sums with shape ``(num_labels, num_frames)``.
+    """
+    num_frames = pet_image_4d.shape[3]
+    label_sums = np.zeros((num_labels, num_frames), dtype=np.float64)
+    for frame in numba.prange(num_frames):
+        for voxel in range(flat_labels.shape[0]):
+            label_sums[flat_labels[voxel], frame] += pet_image_4d[x_inds[voxel], y_inds[voxel], z_inds[voxel], frame]
+    return label_sums
+
+
+def _sum_pet_by_label(pet_image_4d: np.ndarray,
+                      seg_image: np.ndarray,
+                      regions: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sums a 4D PET image within each region of a segmentation with the same sampling, using
+    :func:`_label_sums_kernel`. A voxel belongs to a region if its segmentation value is within
+    0.1 of the region value.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The sums with shape ``(len(regions), num_frames)`` and the
+        voxel counts with shape ``(len(regions),)``.
+    """
+    regions = np.asarray(regions, dtype=np.int64)
+    seg_labels = np.rint(seg_image)
+    labelled_voxels = (np.abs(seg_image - seg_labels) < 0.1) & (seg_labels >= 0)
+    flat_labels = seg_labels[labelled_voxels].astype(np.int64)
+    num_labels = max(int(flat_labels.max(initial=-1)), int(regions.max(initial=-1))) + 1
+
+    x_inds, y_inds, z_inds = np.nonzero(labelled_voxels)
+    label_counts = np.bincount(flat_labels, minlength=num_labels)[regions]
+    label_sums = _label_sums_kernel(pet_image_4d, x_inds, y_inds, z_inds, flat_labels, num_labels)[regions]
+    return label_sums, label_counts
+
+
 def threshold(input_image_numpy: np.ndarray,
               lower_bound: float=-np.inf,
               upper_bound: float=np.inf):
@@ -540,39 +679,102 @@ def write_tacs(input_image_path: str,
                out_tac_dir: str,
                verbose: bool,
                time_frame_keyword: str = 'FrameReferenceTime',
-               out_tac_prefix: str = '', ):
+               out_tac_prefix: str = '',
+               frame_times: np.ndarray | None = None,
+               vectorized: bool = True,
+               z_tile: int | None = None):
     """
     Function to write Tissue Activity Curves for each region, given a segmentation,
     4D PET image, and label map. Computes the average of the PET image within each
     region. Writes a JSON for each region with region name, frame start time, and mean 
     value within region.
+
+    If ``frame_times`` is provided, it is written as the time column instead of reading
+    ``time_frame_keyword`` from the metadata of the PET image. This lets callers that already
+    loaded the frame timing, e.g. with :class:`~petpal.utils.scan_timing.ScanTimingInfo`, skip
+    re-reading the sidecar.
+
+    By default (``vectorized=True``), the TACs of all regions are computed together with
+    :meth:`extract_mean_roi_tacs_from_nifti_using_segmentation`, which touches each voxel once per
+    frame regardless of the number of regions. Set ``vectorized=False`` to mask the image once per
+    region with :meth:`extract_mean_roi_tac_from_nifti_using_segmentation` instead.
+
+    If ``z_tile`` is set, the PET image is not loaded whole. Instead, slabs of ``z_tile`` slices
+    with all frames are read in turn from the image on disk, and per-region sums and voxel counts
+    are accumulated over the slabs. This caps memory at one slab of the PET image, and implies the
+    vectorized computation. ``z_tile`` is ignored for compressed (``.gz``) images, which are read in
+    one go, since reading each slab would decompress the file from the start.
     """
 
     if time_frame_keyword not in ['FrameReferenceTime', 'FrameTimesStart']:
         raise ValueError("'time_frame_keyword' must be one of "
                          "'FrameReferenceTime' or 'FrameTimesStart'")
 
-    pet_meta = image_io.load_metadata_for_nifti_with_same_filename(input_image_path)
+    if frame_times is None:
+        pet_meta = image_io.load_metadata_for_nifti_with_same_filename(input_image_path)
+        frame_times = pet_meta[time_frame_keyword]
+    frame_times = np.asarray(frame_times)
     label_map = image_io.ImageIO.read_label_map_tsv(label_map_file=label_map_path)
     regions_abrev = label_map['abbreviation']
     regions_map = label_map['mapping']
 
     tac_extraction_func = extract_mean_roi_tac_from_nifti_using_segmentation
-    pet_numpy = nibabel.load(input_image_path).get_fdata()
     seg_numpy = nibabel.load(segmentation_image_path).get_fdata()
-
+    regions = [int(region) for region in regions_map]
+
+    if z_tile is not None and input_image_path.endswith('.gz'):
+        z_tile, vectorized = None, True
+
+    if z_tile is not None:
+        pet_proxy = nibabel.load(input_image_path).dataobj
+        if seg_numpy.shape[:3]!=pet_proxy.shape[:3]:
+            raise ValueError('Mis-match in image shape of segmentation image '
+                             f'({seg_numpy.shape}) and PET image '
+                             f'({pet_proxy.shape[:3]}). Consider resampling '
+                             'segmentation to PET or vice versa.')
+        label_sums, label_counts = 0.0, 0
+        for z_start in range(0, pet_proxy.shape[2], z_tile):
+            # float32 halves the slab; the region sums are still accumulated in float64
+            pet_slab = np.asarray(pet_proxy[:, :, z_start:z_start + z_tile, ...], dtype=np.float32)
+            if pet_slab.ndim == 3:
+                pet_slab = pet_slab[..., np.newaxis]
+            slab_sums, slab_counts = _sum_pet_by_label(pet_image_4d=pet_slab,
+                                                       seg_image=seg_numpy[:, :, z_start:z_start + z_tile],
+                                                       regions=regions)
+            label_sums = label_sums + slab_sums
+            label_counts = label_counts + slab_counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            all_tacs = label_sums / label_counts[:, np.newaxis]
+    else:
+        pet_numpy = nibabel.load(input_image_path).get_fdata()
+        if vectorized:
+            all_tacs = extract_mean_roi_tacs_from_nifti_using_segmentation(input_image_4d_numpy=pet_numpy,
+                                                                           segmentation_image_numpy=seg_numpy,
+                                                                           regions=regions)
+
+    # the time column is the same for every region, so it is formatted only once
+    time_strs = [f'{frame_time:.18e}' for frame_time in np.asarray(frame_times, dtype=float)]
     for i, _maps in enumerate(label_map['mapping']):
-        extracted_tac = tac_extraction_func(input_image_4d_numpy=pet_numpy,
-                                            segmentation_image_numpy=seg_numpy,
-                                            region=int(regions_map[i]),
-                                            verbose=verbose)
-        region_tac_file = np.array([pet_meta[time_frame_keyword],extracted_tac]).T
+        if vectorized or z_tile is not None:
+            extracted_tac = all_tacs[i]
+        else:
+            extracted_tac = tac_extraction_func(input_image_4d_numpy=pet_numpy,
+                                                segmentation_image_numpy=seg_numpy,
+                                                region=regions[i],
+                                                verbose=verbose)
+        if len(extracted_tac) != len(time_strs):
+            raise ValueError(f'Number of frame times ({len(time_strs)}) does not match the number of '
+                             f'frames in the TAC of region {regions_abrev[i]} ({len(extracted_tac)}).')
         header_text = f'{time_frame_keyword}\t{regions_abrev[i]}_mean_activity'
         if out_tac_prefix:
             out_tac_path = os.path.join(out_tac_dir, f'{out_tac_prefix}_seg-{regions_abrev[i]}_tac.tsv')
         else:
             out_tac_path = os.path.join(out_tac_dir, f'seg-{regions_abrev[i]}_tac.tsv')
-        np.savetxt(out_tac_path,region_tac_file,delimiter='\t',header=header_text,comments='')
+        # same output as np.savetxt with the default fmt, written with a single buffered write
+        tac_lines = ''.join(f'{time_str}\t{tac_val:.18e}\n'
+                            for time_str, tac_val in zip(time_strs, np.asarray(extracted_tac, dtype=float)))
+        with open(out_tac_path, 'w', encoding='latin1', newline='', buffering=262144) as tac_file:
+            tac_file.write(f'{header_text}\n{tac_lines}')
 
 
 def extract_roi_voxel_tacs_from_image_using_mask(input_image: ants.core.ANTsImage,
@@ -618,7 +820,7 @@ class SimpleAutoImageCropper(object):
 
     Attributes:
         input_image_path (str): The file path to the input image.
-        out_image_path (str): The file path to save the cropped image.
+        out_image_path (str | None): The file path to save the cropped image, if any.
         thresh (float): The threshold value used to determine the boundaries.
         verbose (bool): If True, prints information about image shapes.
         input_img_obj (nibabel.Nifti1Image): The loaded input image object.
@@ -648,7 +850,7 @@ class SimpleAutoImageCropper(object):
     """
     def __init__(self,
                  input_image_path: str,
-                 out_image_path: str,
+                 out_image_path: str | None,
                  thresh_val: float = 1.0e-2,
                  verbose: bool = True,
                  copy_metadata: bool = True
@@ -662,7 +864,8 @@ class SimpleAutoImageCropper(object):
 
         Args:
             input_image_path (str): The file path to the input image.
-            out_image_path (str): The file path to save the cropped image.
+            out_image_path (str | None): The file path to save the cropped image. If None, the
+                cropped image is only kept in memory as :attr:`crop_img_obj`.
             thresh_val (float, optional): The threshold value used to determine the boundaries.
                 Must be less than 0.5. Defaults to 1e-2.
             verbose (bool, optional): If True, prints information about image shapes. Defaults to
@@ -695,10 +898,11 @@ class SimpleAutoImageCropper(object):
         self.input_img_obj = nibabel.load(self.input_image_path)
         self.crop_img_obj = self.get_cropped_image(img_obj=self.input_img_obj, thresh=self.thresh)
 
-        nibabel.save(filename=self.out_image_path, img=self.crop_img_obj)
-        if copy_metadata:
-            image_io.safe_copy_meta(input_image_path=self.input_image_path,
-                                    out_image_path=self.out_image_path)
+        if self.out_image_path is not None:
+            nibabel.save(filename=self.out_image_path, img=self.crop_img_obj)
+            if copy_metadata:
+                image_io.safe_copy_meta(input_image_path=self.input_image_path,
+                                        out_image_path=self.out_image_path)
 
         if verbose:
             print(f"(info): Input image has shape:  {self.input_img_obj.shape}")
@@ -783,6 +987,33 @@ class SimpleAutoImageCropper(object):
         l_ind, r_ind = np.argwhere(norm_prof > thresh).T[0][[0, -1]]
         return l_ind, r_ind
 
+    @staticmethod
+    def _get_mean_over_frames(img_obj: nibabel.Nifti1Image) -> np.ndarray:
+        r"""
+        Computes the float32 mean over the last dimension of a 4D image.
+
+        For uncompressed files on disk, frames are read one at a time through the array proxy so
+        that only a single 3D frame is held in memory besides the running sum. Compressed files
+        and in-memory images are read in one go, since seeking into a gzip stream frame by frame
+        would decompress the file from the start for every frame.
+
+        Args:
+            img_obj (nibabel.Nifti1Image): The input 4D NIfTI image object.
+
+        Returns:
+            np.ndarray: The 3D mean image.
+        """
+        img_path = img_obj.get_filename()
+        if not nibabel.is_proxy(img_obj.dataobj) or img_path is None or img_path.endswith('.gz'):
+            return np.mean(np.asarray(img_obj.dataobj, dtype=np.float32), axis=-1)
+
+        num_frames = img_obj.shape[-1]
+        mean_data = np.zeros(img_obj.shape[:3], dtype=np.float32)
+        for frame in range(num_frames):
+            mean_data += np.asarray(img_obj.dataobj[..., frame], dtype=np.float32)
+        mean_data /= num_frames
+        return mean_data
+
     @staticmethod
     def get_index_pairs_for_all_dims(img_obj: nibabel.Nifti1Image, thresh: float = 1e-2):
         r"""
@@ -821,10 +1052,12 @@ class SimpleAutoImageCropper(object):
                 print(boundaries)
         
         """
+        # float32 straight from the array proxy: the profiles only need to be thresholded, and
+        # this avoids materializing (and caching on img_obj) a float64 copy of the whole series
         if len(img_obj.shape) > 3:
-            tmp_data = np.mean(img_obj.get_fdata(), axis=-1)
+            tmp_data = SimpleAutoImageCropper._get_mean_over_frames(img_obj=img_obj)
         else:
-            tmp_data = img_obj.get_fdata()
+            tmp_data = np.asarray(img_obj.dataobj, dtype=np.float32)
 
         prof_func = SimpleAutoImageCropper.gen_line_profile
         index_func = SimpleAutoImageCropper.get_left_and_right_boundary_indices_for_threshold
@@ -882,3 +1115,50 @@ class SimpleAutoImageCropper(object):
                                                                                                  thresh=thresh)
 
         return img_obj.slicer[x_l:x_r, y_l:y_r, z_l:z_r, ...]
+
+    @staticmethod
+    def get_cropped_ants_image(input_image_path: str, thresh: float = 1e-2) -> ants.core.ANTsImage:
+        r"""
+        Crops the input image as in :meth:`get_cropped_image`, but reads and returns it as an
+        ANTs image so that it can be passed straight to ANTs-based steps without being written to
+        disk and read back.
+
+        The crop boundaries are determined from the NIfTI file, and the same voxel index bounds
+        are then applied to the image as read by ANTs.
+
+        Args:
+            input_image_path (str): The file path to the input 3D or 4D image.
+            thresh (float, optional): The threshold value used to determine the boundaries.
+                                      Must be less than 0.5. Defaults to 1e-2.
+
+        Returns:
+            ants.core.ANTsImage: The cropped image.
+
+        Example:
+
+            .. code-block:: python
+
+                from petpal.preproc.image_operations_4d import SimpleAutoImageCropper
+                from petpal.preproc.motion_corr import windowed_motion_corr_to_target
+
+                cropped_img = SimpleAutoImageCropper.get_cropped_ants_image(
+                    input_image_path='path/to/input_image_path.nii.gz', thresh=0.01)
+                windowed_motion_corr_to_target(input_image_path='path/to/input_image_path.nii.gz',
+                                               out_image_path='path/to/output_image.nii.gz',
+                                               motion_target_option=(0, 600),
+                                               w_size=300,
+                                               input_image=cropped_img)
+
+        See Also:
+            - :meth:`get_cropped_image`
+            - :meth:`get_index_pairs_for_all_dims`
+        """
+        index_pairs = SimpleAutoImageCropper.get_index_pairs_for_all_dims(img_obj=nibabel.load(input_image_path),
+                                                                          thresh=thresh)
+        input_image = ants.image_read(input_image_path)
+        lower_ind = [left for left, _ in index_pairs]
+        upper_ind = [right for _, right in index_pairs]
+        if input_image.dimension > 3:
+            lower_ind += [0] * (input_image.dimension - 3)
+            upper_ind += list(input_image.shape[3:])
+        return ants.crop_indices(image=input_image, lowerind=lower_ind, upperind=upper_ind)
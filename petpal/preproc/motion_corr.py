@@ -4,11 +4,12 @@ Provides methods to motion correct 4D PET data. Includes method
 4D input data to optimize contrast when computing motion correction or
 registration.
 """
+import os
 import ants
 import numpy as np
 
 
-from .image_operations_4d import determine_motion_target
+from .image_operations_4d import determine_motion_target, get_average_of_timeseries
 from ..utils import image_io
 from ..utils.scan_timing import ScanTimingInfo, get_window_index_pairs_for_image
 from ..utils.useful_functions import weighted_series_sum_over_window_indecies
@@ -451,6 +452,7 @@ def windowed_motion_corr_to_target(input_image_path: str,
                                    type_of_transform: str = 'QuickRigid',
                                    interpolator: str = 'linear',
                                    copy_metadata: bool = True,
+                                   input_image: ants.core.ANTsImage | None = None,
                                    **kwargs):
     """
     Performs windowed motion correction (MoCo) to align frames of a 4D PET image to a given target image.
@@ -473,6 +475,14 @@ def windowed_motion_corr_to_target(input_image_path: str,
         w_size (float): Window size in seconds for dividing the image into time sections.
         type_of_transform (str): Type of transformation to use in registration (default: 'QuickRigid').
         interpolator (str): Interpolation method for the transformation (default: 'linear').
+        copy_metadata (bool): If True, copies the metadata of `input_image_path` to the output
+            image (default: True).
+        input_image (ants.core.ANTsImage | None): Optional 4D image already in memory, e.g. the
+            output of :meth:`SimpleAutoImageCropper.get_cropped_ants_image`. If provided, it is
+            motion corrected instead of reading `input_image_path`, which is then only used for
+            its frame timing metadata. Must have the same frames as `input_image_path`. If the
+            motion target is computed from the PET, it is computed from this image.
+            See :func:`determine_motion_target_from_image`.
         **kwargs: Additional arguments passed to :func:`ants.registration`.
 
     Returns:
@@ -493,16 +503,22 @@ def windowed_motion_corr_to_target(input_image_path: str,
     Note:
         If `out_image_path` is provided, the corrected 4D image will be saved to the specified path.
     """
-    input_image = ants.image_read(filename=input_image_path)
-    input_image_list = ants.ndimage_to_list(input_image)
     window_idx_pairs = get_window_index_pairs_for_image(image_path=input_image_path, w_size=w_size)
     half_life = get_half_life_from_nifti(image_path=input_image_path)
     frame_timing_info = ScanTimingInfo.from_nifti(image_path=input_image_path)
 
-    target_image = determine_motion_target(motion_target_option=motion_target_option,
-                                           input_image_4d_path=input_image_path,
-                                           half_life=half_life)
-    target_image = ants.image_read(target_image)
+    if input_image is None:
+        input_image = ants.image_read(filename=input_image_path)
+        target_image = determine_motion_target(motion_target_option=motion_target_option,
+                                               input_image_4d_path=input_image_path,
+                                               half_life=half_life)
+        target_image = ants.image_read(target_image)
+    else:
+        target_image = determine_motion_target_from_image(motion_target_option=motion_target_option,
+                                                          input_image_4d=input_image,
+                                                          half_life=half_life,
+                                                          image_frame_info=frame_timing_info)
+    input_image_list = ants.ndimage_to_list(input_image)
 
     reg_kwargs_default = {'aff_metric'               : 'mattes',
                           'write_composite_transform': True}
@@ -536,6 +552,79 @@ def windowed_motion_corr_to_target(input_image_path: str,
                                 out_image_path=out_image_path)
     return out_image
 
+def determine_motion_target_from_image(motion_target_option: str | tuple | list,
+                                      input_image_4d: ants.core.ANTsImage,
+                                      half_life: float,
+                                      image_frame_info: ScanTimingInfo) -> ants.core.ANTsImage:
+    """
+    In-memory counterpart of :func:`determine_motion_target`: produce the motion target from a 4D
+    image that has not been written to disk, without writing any temporary files.
+
+    The options behave as in :func:`determine_motion_target`. A path to an existing file is read
+    as the target. ``weighted_series_sum`` sums all frames, ``mean_image`` averages all frames,
+    and a tuple of times in seconds, counted from the start of the first frame, sums the frames
+    between the frames nearest to those times.
+
+    Args:
+        motion_target_option (str | tuple | list): A file, a method ('weighted_series_sum' or
+            'mean_image'), or a tuple range e.g. (0,600).
+        input_image_4d (ants.core.ANTsImage): The 4D PET image.
+        half_life (float): Half life of the radiotracer used in the image.
+        image_frame_info (ScanTimingInfo): Frame timing information for ``input_image_4d``.
+
+    Returns:
+        ants.core.ANTsImage: Image to use as a target to compute transformations on.
+
+    Raises:
+        ValueError: If ``motion_target_option`` does not match an acceptable option.
+        TypeError: If start and end time are incompatible with ``float`` type.
+    """
+    num_frames = input_image_4d.shape[-1]
+
+    if isinstance(motion_target_option, str):
+        if os.path.exists(motion_target_option):
+            return ants.image_read(motion_target_option)
+
+        if motion_target_option == 'weighted_series_sum':
+            return weighted_series_sum_over_window_indecies(input_image_4d=input_image_4d,
+                                                            output_image_path=None,
+                                                            window_start_id=0,
+                                                            window_end_id=num_frames,
+                                                            half_life=half_life,
+                                                            image_frame_info=image_frame_info)
+
+        if motion_target_option == 'mean_image':
+            return get_average_of_timeseries(input_image=input_image_4d)
+
+        raise ValueError("motion_target_option did not match a file or 'weighted_series_sum'")
+
+    if isinstance(motion_target_option, (list, tuple)):
+        start_time, end_time = motion_target_option[0], motion_target_option[1]
+        try:
+            start_time = float(start_time)
+            end_time = float(end_time)
+        except Exception as exc:
+            raise TypeError('Start time and end time of calculation must be '
+                            'able to be cast into float! Provided values are '
+                            f"{start_time} and {end_time}.") from exc
+
+        frame_starts = np.asarray(image_frame_info.start)
+        scan_start = frame_starts[0]
+        first_frame = int(np.argmin(np.abs(frame_starts - (start_time + scan_start))))
+        last_frame = int(np.argmin(np.abs(frame_starts - (end_time + scan_start))))
+        if first_frame == last_frame:
+            last_frame += 1
+
+        return weighted_series_sum_over_window_indecies(input_image_4d=input_image_4d,
+                                                        output_image_path=None,
+                                                        window_start_id=first_frame,
+                                                        window_end_id=last_frame,
+                                                        half_life=half_life,
+                                                        image_frame_info=image_frame_info)
+
+    raise ValueError('motion_target_option did not match str or tuple type.')
+
+
 def gen_timeseries_from_image_list(image_list: list[ants.core.ANTsImage]) -> ants.core.ANTsImage:
     r"""
     Takes a list of ANTs ndimages, and generates a 4D ndimage. Undoes :func:`ants.ndimage_to_list`
@@ -5,34 +5,183 @@ handling file paths, and managing neuroimaging data files. Key features include
 filepaths for efficient retrieval, and supporting various neuroimaging file types through integration with `nibabel`.
 """
 import os
-import pathlib
+import re
+import sys
+import json
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 
 from bids_validator import BIDSValidator
 
 
+@functools.cache
+def _get_bids_validator() -> BIDSValidator:
+    """
+    Returns a single, shared :class:`BIDSValidator` so that it is only constructed once per process.
+    """
+    return BIDSValidator()
+
+
+@functools.lru_cache(maxsize=100_000)
+def _is_bids_cached(filepath: str) -> bool:
+    """
+    Memoized :meth:`BIDSValidator.is_bids` using the shared validator. Since the result only depends
+    on the path string, callers should pass paths relative to the dataset root (with a leading '/'),
+    so that the same relative path in different datasets shares one cache entry.
+    """
+    return _get_bids_validator().is_bids(filepath)
+
+
 def validate_filepath_as_bids(filepath: str) -> bool:
     """
     Validate whether a given filepath conforms to the Brain Imaging Data Structure (BIDS) standard.
 
     Args:
-        filepath (str): The path to the file to be validated.
+        filepath (str): The path to the file to be validated, relative to the root of the BIDS
+            dataset and with a leading '/', e.g. '/sub-01/anat/sub-01_T1w.nii.gz'.
 
     Returns:
         bool: True if the file conforms to the BIDS standard, False otherwise.
 
     """
-    validator = BIDSValidator()
-    return validator.is_bids(filepath)
+    return _is_bids_cached(str(filepath))
+
+
+def validate_filepaths_as_bids_batch(filepaths) -> np.ndarray:
+    """
+    Batch counterpart of :func:`validate_filepath_as_bids`.
+
+    Each distinct path is checked once, so repeated paths in ``filepaths`` cost a single
+    validation.
+
+    Args:
+        filepaths (Iterable[str]): Paths of the files to be validated, relative to the root of the
+            BIDS dataset and with a leading '/'.
+
+    Returns:
+        np.ndarray: Boolean mask, True where the file conforms to the BIDS standard, in the order of
+        ``filepaths``.
+    """
+    filepaths = [str(filepath) for filepath in filepaths]
+    results = {filepath: _is_bids_cached(filepath) for filepath in dict.fromkeys(filepaths)}
+    return np.fromiter((results[filepath] for filepath in filepaths), dtype=bool, count=len(filepaths))
+
+
+_BIDS_CACHE_FILENAME = '.petpal_bids_cache.json'
+_BIDS_EXCLUDED_DIRS = frozenset({'code', 'derivatives', 'sourcedata', '.git', 'stimuli'})
+_EXCL_RE = re.compile('|'.join([r'sub-.*', r'\..*', *sorted(re.escape(d) for d in _BIDS_EXCLUDED_DIRS)]))
+_EXCL_KEEP_DERIVATIVES_RE = re.compile('|'.join([r'sub-.*', r'\..*',
+                                                 *sorted(re.escape(d) for d in _BIDS_EXCLUDED_DIRS - {'derivatives'})]))
+
+
+def _walk_bids(root: str, excluded_re: re.Pattern = _EXCL_RE):
+    """
+    Recursively yields the paths of all files under ``root`` using :func:`os.scandir`, skipping
+    directories whose whole name matches ``excluded_re``: by default those in
+    ``_BIDS_EXCLUDED_DIRS``, hidden (dot) directories, and those starting with 'sub-'.
+
+    The ``DirEntry`` objects returned by :func:`os.scandir` already know whether they are
+    directories on most platforms, so no extra ``stat`` call is needed per entry. As with
+    :func:`os.walk`, symbolic links to directories are neither followed nor yielded. The cache file
+    of :func:`validate_directory_as_bids_incremental` is not yielded either.
+
+    Args:
+        root (str): The directory to walk.
+        excluded_re (re.Pattern): Pattern for names of directories to skip.
+
+    Yields:
+        str: Path of each file found.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if entry.is_symlink() or excluded_re.fullmatch(entry.name):
+                    continue
+                yield from _walk_bids(entry.path, excluded_re)
+            elif entry.name != _BIDS_CACHE_FILENAME:
+                yield entry.path
+
+
+def iter_invalid_bids_filepaths(project_path: str,
+                                include_subjects: bool = False,
+                                workers: int = 8,
+                                *,
+                                keep_derivatives: bool = False):
+    """
+    Lazily yields the paths of files in a project that do not conform to the BIDS standard.
+
+    The same files as in :func:`validate_directory_as_bids` are checked, with the same options.
+    Failures are yielded as they are found, so callers can consume them without holding all of
+    them in memory.
+
+    Args:
+        project_path (str): The root directory of the project to validate.
+        include_subjects (bool): If True, also validate the files in the top-level 'sub-*'
+            directories, one process per subject directory. Defaults to False.
+        workers (int): Maximum number of processes used to validate subject directories when
+            ``include_subjects`` is True. If 1 or less, subjects are validated sequentially.
+            Defaults to 8.
+        keep_derivatives (bool): If True, also validate files in 'derivatives' directories.
+            Defaults to False.
+
+    Yields:
+        str: Path of each file that failed validation.
+
+    Raises:
+        FileNotFoundError: If the provided project_path does not exist or is inaccessible.
+    """
+    excluded_re = _EXCL_KEEP_DERIVATIVES_RE if keep_derivatives else _EXCL_RE
+    root_len = len(os.path.join(project_path, ''))
+
+    for filepath in _walk_bids(project_path, excluded_re):
+        if not validate_filepath_as_bids('/' + filepath[root_len:].replace(os.sep, '/')):
+            yield filepath
+
+    if not include_subjects:
+        return
+
+    with os.scandir(project_path) as entries:
+        subject_dirs = sorted(entry.path for entry in entries
+                              if entry.is_dir() and entry.name.startswith('sub-'))
+    num_subjects = len(subject_dirs)
+    if workers > 1 and num_subjects > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, num_subjects)) as executor:
+            for sub_failed_paths in executor.map(_validate_subject_dir, [project_path] * num_subjects,
+                                                 subject_dirs, [excluded_re] * num_subjects):
+                yield from sub_failed_paths
+    else:
+        for sub_dir in subject_dirs:
+            yield from _validate_subject_dir(project_path, sub_dir, excluded_re)
 
 
-def validate_directory_as_bids(project_path: str) -> bool:
+def validate_directory_as_bids(project_path: str,
+                               include_subjects: bool = False,
+                               workers: int = 8,
+                               *,
+                               keep_derivatives: bool = False,
+                               failures_out=None,
+                               failures_log_path: str | None = None) -> bool:
     """
     Validate whether all files in a given directory and its subdirectories (excluding specified ones)
     conform to the Brain Imaging Data Structure (BIDS) standard.
 
     Args:
         project_path (str): The root directory of the project to validate.
+        include_subjects (bool): If True, also validate the files in the top-level 'sub-*'
+            directories. Each subject directory is validated in a separate process, using
+            :func:`_validate_subject_dir`. Defaults to False.
+        workers (int): Maximum number of processes used to validate subject directories when
+            ``include_subjects`` is True. If 1 or less, subjects are validated sequentially.
+            Defaults to 8.
+        keep_derivatives (bool): If True, also validate files in 'derivatives' directories.
+            Defaults to False.
+        failures_out (TextIO, optional): Stream to which the report is written. Failed file paths
+            are written as soon as they are found, rather than collected in memory. If None,
+            ``sys.stdout`` is used.
+        failures_log_path (str | None): If given, the report is written to this file instead,
+            through a single handle with a 1 MiB buffer. Takes precedence over ``failures_out``.
 
     Returns:
         bool: True if all files in the directory conform to the BIDS standard, False if any do not.
@@ -42,19 +191,87 @@ def validate_directory_as_bids(project_path: str) -> bool:
 
     Notes:
         Excludes directories typically not needed for BIDS validation, such as 'code', 'derivatives',
-        'sourcedata', '.git', and 'stimuli'. Also skips directories starting with 'sub-' to focus on top-level structure.
+        'sourcedata', 'stimuli', and hidden directories like '.git'. Also skips directories starting with
+        'sub-' to focus on top-level structure, unless ``include_subjects`` is True.
+
+    See Also:
+        - :func:`iter_invalid_bids_filepaths`
+    """
+    invalid_filepaths = iter_invalid_bids_filepaths(project_path=project_path,
+                                                    include_subjects=include_subjects,
+                                                    workers=workers,
+                                                    keep_derivatives=keep_derivatives)
+    if failures_log_path is not None:
+        with open(failures_log_path, 'w', encoding='utf-8', buffering=1 << 20) as log_file:
+            return _report_invalid_filepaths(invalid_filepaths, out=log_file)
+    return _report_invalid_filepaths(invalid_filepaths, out=sys.stdout if failures_out is None else failures_out)
+
+
+def _report_invalid_filepaths(invalid_filepaths, out) -> bool:
+    """
+    Writes each path from ``invalid_filepaths`` to ``out`` as it arrives, under a 'Failed file paths:'
+    header, or a success message if there are none.
+
+    Returns:
+        bool: True if there were no invalid file paths.
     """
-    excluded_dirs = {'code', 'derivatives', 'sourcedata', '.git', 'stimuli'}
     all_passed = True
+    for filepath in invalid_filepaths:
+        if all_passed:
+            out.write("Failed file paths:\n")
+            all_passed = False
+        out.write(f"{filepath}\n")
+    if all_passed:
+        out.write("All files passed validation.\n")
+    return all_passed
+
+
+def _validate_subject_dir(project_path: str, sub_root: str, excluded_re: re.Pattern = _EXCL_RE) -> list[str]:
+    """
+    Validates all files in a single subject directory of a BIDS project. Used as the per-subject
+    worker of :func:`iter_invalid_bids_filepaths`.
+
+    Files are checked by their path relative to ``project_path``, with a leading '/', as expected
+    by :meth:`BIDSValidator.is_bids`.
+
+    Args:
+        project_path (str): The root directory of the project.
+        sub_root (str): The subject directory to validate, inside ``project_path``.
+        excluded_re (re.Pattern): Pattern for names of directories to skip. See :func:`_walk_bids`.
+
+    Returns:
+        list[str]: Paths of the files that failed validation.
+    """
+    root_len = len(os.path.join(project_path, ''))
+    filepaths = list(_walk_bids(sub_root, excluded_re))
+    valid_mask = validate_filepaths_as_bids_batch('/' + filepath[root_len:].replace(os.sep, '/')
+                                                  for filepath in filepaths)
+    return [filepath for filepath, is_valid in zip(filepaths, valid_mask) if not is_valid]
+
+
+def validate_directory_as_bids_fast(project_path: str) -> bool:
+    """
+    Faster variant of :func:`validate_directory_as_bids`, checking the same set of files.
+
+    Files are checked directly with the memoized validator, without the subject sharding and
+    report streaming options of :func:`validate_directory_as_bids`.
+
+    Args:
+        project_path (str): The root directory of the project to validate.
+
+    Returns:
+        bool: True if all files in the directory conform to the BIDS standard, False if any do not.
+
+    Raises:
+        FileNotFoundError: If the provided project_path does not exist or is inaccessible.
+    """
+    root_len = len(os.path.join(project_path, ''))
     failed_file_paths = []
 
-    for root, dirs, files in os.walk(project_path, topdown=True):
-        dirs[:] = [d for d in dirs if d not in excluded_dirs and not d.startswith('sub-')]
-        for file in files:
-            filepath = os.path.join(root, file)
-            if not validate_filepath_as_bids(filepath):
-                failed_file_paths.append(filepath)
-                all_passed = False
+    for filepath in _walk_bids(project_path):
+        bids_path = '/' + filepath[root_len:].replace(os.sep, '/')
+        if not _is_bids_cached(bids_path):
+            failed_file_paths.append(filepath)
 
     if failed_file_paths:
         print("Failed file paths:")
@@ -63,14 +280,91 @@ def validate_directory_as_bids(project_path: str) -> bool:
     else:
         print("All files passed validation.")
 
-    return all_passed
+    return not failed_file_paths
 
 
+def validate_directory_as_bids_incremental(project_path: str, cache_path: str | None = None) -> bool:
+    """
+    Variant of :func:`validate_directory_as_bids_fast` that keeps a cache of results between runs,
+    so that unchanged directories are neither listed nor re-validated.
+
+    Whether a file path is valid BIDS only depends on its path relative to the project root. A
+    directory's contents only change when its modification time does. For each directory, the
+    cache stores its modification time, its subdirectories, and the names of its files that
+    failed validation, keyed on the path relative to ``project_path``. On later runs a directory
+    whose modification time is unchanged costs a single ``stat`` call: its cached results are
+    reused and only its cached subdirectories are visited. Directories that changed are listed and
+    validated again.
+
+    Args:
+        project_path (str): The root directory of the project to validate.
+        cache_path (str | None): Path of the JSON cache file. If None, ``.petpal_bids_cache.json``
+            in ``project_path`` is used. The cache file itself is not validated. If the cache
+            cannot be written, e.g. on a read-only dataset, the results are not cached.
+
+    Returns:
+        bool: True if all files in the directory conform to the BIDS standard, False if any do not.
+
+    Raises:
+        FileNotFoundError: If the provided project_path does not exist or is inaccessible.
+    """
+    if cache_path is None:
+        cache_path = os.path.join(project_path, _BIDS_CACHE_FILENAME)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            old_cache = json.load(cache_file)
+    except (OSError, ValueError):
+        old_cache = {}
+    cache_abspath = os.path.abspath(cache_path)
+
+    new_cache = {}
+    failed_file_paths = []
+    dirs_to_visit = [('', project_path)]
+    while dirs_to_visit:
+        rel_dir, abs_dir = dirs_to_visit.pop()
+        mtime_ns = os.stat(abs_dir).st_mtime_ns
+        dir_results = old_cache.get(rel_dir)
+        if dir_results is None or dir_results['mtime_ns'] != mtime_ns:
+            sub_dirs, failed_names = [], []
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if not (entry.is_symlink() or _EXCL_RE.fullmatch(entry.name)):
+                            sub_dirs.append(entry.name)
+                    elif os.path.abspath(entry.path) != cache_abspath:
+                        if not _is_bids_cached(f'{rel_dir}/{entry.name}'):
+                            failed_names.append(entry.name)
+            dir_results = {'mtime_ns': mtime_ns, 'dirs': sub_dirs, 'failed': failed_names}
+        new_cache[rel_dir] = dir_results
+        failed_file_paths.extend(os.path.join(abs_dir, name) for name in dir_results['failed'])
+        dirs_to_visit.extend((f'{rel_dir}/{name}', os.path.join(abs_dir, name)) for name in dir_results['dirs'])
+
+    # written in place, so that rewriting an existing cache does not change the directory mtime
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(new_cache, cache_file)
+    except OSError:
+        pass
+
+    if failed_file_paths:
+        print("Failed file paths:")
+        for path in failed_file_paths:
+            print(path)
+    else:
+        print("All files passed validation.")
+
+    return not failed_file_paths
+
+
+_SUB_SES_RE = re.compile(r'sub-([^_]+)_ses-([^_]+)')
+
+
+@functools.lru_cache(maxsize=1024)
 def parse_path_to_get_subject_and_session_id(path):
     """
     Parses a file path to extract subject and session IDs formatted according to BIDS standards.
 
-    This function expects the file name in the path to contain segments starting with 'sub-' and 'ses-'.
+    This function expects the file name in the path to start with segments 'sub-<label>_ses-<label>'.
     If these are not found, it returns default values indicating unknown IDs.
 
     Args:
@@ -79,15 +373,33 @@ def parse_path_to_get_subject_and_session_id(path):
     Returns:
         tuple: A tuple containing the subject ID and session ID.
     """
-    filename = pathlib.Path(path).name
-    if ('sub-' in filename) and ('ses-' in filename):
-        sub_ses_ids = filename.split("_")[:2]
-        sub_id = sub_ses_ids[0].split('sub-')[-1]
-        ses_id = sub_ses_ids[1].split('ses-')[-1]
-        return sub_id, ses_id
-    else:
+    sub_ses_match = _SUB_SES_RE.match(os.path.basename(path))
+    if sub_ses_match is None:
         return "XXXX", "XX"
+    return sub_ses_match.group(1), sub_ses_match.group(2)
 
+def parse_paths_batch(paths) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Batch counterpart of :func:`parse_path_to_get_subject_and_session_id` for many paths, e.g.
+    when indexing a whole dataset.
+
+    The same compiled pattern is applied to the base name of every path in one pass, without the
+    per-call overhead of the memoized single-path function.
+
+    Args:
+        paths (Iterable[str]): The file paths to extract identifiers from.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Arrays of subject IDs and session IDs, in the order of
+        ``paths``. Paths without subject and session IDs get 'XXXX' and 'XX'.
+    """
+    matches = [_SUB_SES_RE.match(os.path.basename(path)) for path in paths]
+    sub_ids = np.array([m.group(1) if m is not None else "XXXX" for m in matches], dtype=object)
+    ses_ids = np.array([m.group(2) if m is not None else "XX" for m in matches], dtype=object)
+    return sub_ids, ses_ids
+
+
+@functools.lru_cache(maxsize=1024)
 def snake_to_camel_case(snake_str):
     """
     Converts a snake_case string to CamelCase.
@@ -100,7 +412,7 @@ def snake_to_camel_case(snake_str):
     Returns:
         str: The converted CamelCase string.
     """
-    return "".join(x.capitalize() for x in snake_str.lower().split("_"))
+    return "".join(x.capitalize() for x in snake_str.split("_"))
 
 def gen_bids_like_filename(sub_id: str, ses_id: str, suffix: str= 'pet', ext: str= '.nii.gz', **extra_desc) -> str:
     """
@@ -118,15 +430,14 @@ def gen_bids_like_filename(sub_id: str, ses_id: str, suffix: str= 'pet', ext: st
     Returns:
         str: A BIDS-like formatted filename.
     """
-    sub_ses_pre = f'sub-{sub_id}_ses-{ses_id}'
-    file_parts = [sub_ses_pre, ]
-    for name, val in extra_desc.items():
-        file_parts.append(f'{name}-{val}')
-    file_parts.append(f'{suffix}{ext}')
-    file_name = "_".join(file_parts)
-    return file_name
-
-def gen_bids_like_dir_path(sub_id: str, ses_id: str, modality: str='pet', sup_dir: str= '../') -> str:
+    if not extra_desc:
+        return f'sub-{sub_id}_ses-{ses_id}_{suffix}{ext}'
+    extra_parts = "_".join([f'{name}-{val}' for name, val in extra_desc.items()])
+    return f'sub-{sub_id}_ses-{ses_id}_{extra_parts}_{suffix}{ext}'
+
+@functools.lru_cache(maxsize=4096)
+def gen_bids_like_dir_path(sub_id: str, ses_id: str, modality: str='pet', sup_dir: str= '../',
+                           safe: bool = False) -> str:
     """
     Constructs a directory path following BIDS structure with subject and session subdirectories.
 
@@ -135,15 +446,23 @@ def gen_bids_like_dir_path(sub_id: str, ses_id: str, modality: str='pet', sup_di
         ses_id (str): The session identifier.
         modality (str, optional): Modality directory name. Defaults to 'pet'.
         sup_dir (str, optional): The parent directory path. Defaults to '../'.
+        safe (bool, optional): If True, always join the parts with :func:`os.path.join`. Otherwise,
+            on platforms using '/' as separator, the path is built directly as a string. Defaults
+            to False.
 
     Returns:
         str: A BIDS-like directory path.
     """
-    path_parts = [f'{sup_dir}', f'sub-{sub_id}', f'ses-{ses_id}', f'{modality}']
-    return os.path.join(*path_parts)
+    if safe or os.sep != '/':
+        return os.path.join(f'{sup_dir}', f'sub-{sub_id}', f'ses-{ses_id}', f'{modality}')
+    sup_dir = str(sup_dir)
+    if not sup_dir:
+        return f'sub-{sub_id}/ses-{ses_id}/{modality}'
+    return f'{sup_dir.rstrip("/")}/sub-{sub_id}/ses-{ses_id}/{modality}'
 
 def gen_bids_like_filepath(sub_id: str, ses_id: str, bids_dir:str ='../',
-                           modality: str='pet', suffix:str='pet', ext='.nii.gz', **extra_desc) -> str:
+                           modality: str='pet', suffix:str='pet', ext='.nii.gz', safe: bool = False,
+                           **extra_desc) -> str:
     """
     Creates a full file path using BIDS-like conventions for both directory structure and filename.
 
@@ -156,6 +475,8 @@ def gen_bids_like_filepath(sub_id: str, ses_id: str, bids_dir:str ='../',
         modality (str, optional): The type of modality. Defaults to 'pet'.
         suffix (str, optional): Suffix indicating the type. Defaults to 'pet'.
         ext (str, optional): The file extension. Defaults to '.nii.gz'.
+        safe (bool, optional): If True, always join paths with :func:`os.path.join`. See
+            :func:`gen_bids_like_dir_path`. Defaults to False.
         **extra_desc: Additional keyword arguments for any extra descriptors.
 
     Returns:
@@ -167,5 +488,7 @@ def gen_bids_like_filepath(sub_id: str, ses_id: str, bids_dir:str ='../',
         
     """
     filename = gen_bids_like_filename(sub_id=sub_id, ses_id=ses_id, suffix=suffix, ext=ext, **extra_desc)
-    filedir  = gen_bids_like_dir_path(sub_id=sub_id, ses_id=ses_id, sup_dir=bids_dir, modality=modality)
-    return os.path.join(filedir, filename)
+    filedir  = gen_bids_like_dir_path(sub_id=sub_id, ses_id=ses_id, sup_dir=bids_dir, modality=modality, safe=safe)
+    if safe or os.sep != '/':
+        return os.path.join(filedir, filename)
+    return f'{filedir}/{filename}'
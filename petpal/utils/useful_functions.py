@@ -92,7 +92,8 @@ def weighted_series_sum(input_image_4d_path: str,
                         half_life: float,
                         verbose: bool=False,
                         start_time: float=0,
-                        end_time: float=-1) -> np.ndarray:
+                        end_time: float=-1,
+                        image_frame_info: scan_timing.ScanTimingInfo | None = None) -> np.ndarray:
     r"""
     Sum a 4D image series weighted based on time and re-corrected for decay correction.
 
@@ -136,6 +137,9 @@ def weighted_series_sum(input_image_4d_path: str,
         end_time (float): Time, relative to scan start in seconds, at which
             calculation ends. Use value ``-1`` to use all frames in image series.
             If equal to ``start_time``, one frame at start_time is used. Default value -1.
+        image_frame_info (scan_timing.ScanTimingInfo | None): Frame timing information for the
+            input image. If None, it is read from the metadata file of the input image.
+            Default value None.
 
     Returns:
         np.ndarray: 3D image array, in the same space as the input, with the weighted sum
@@ -146,28 +150,35 @@ def weighted_series_sum(input_image_4d_path: str,
     """
     if half_life <= 0:
         raise ValueError('(ImageOps4d): Radioisotope half life is zero or negative.')
-    pet_meta = image_io.load_metadata_for_nifti_with_same_filename(input_image_4d_path)
     pet_image = nibabel.load(input_image_4d_path)
-    pet_series = pet_image.get_fdata()
-    frame_start = pet_meta['FrameTimesStart']
-    frame_duration = pet_meta['FrameDuration']
-
-    if 'DecayCorrectionFactor' in pet_meta.keys():
-        decay_correction = pet_meta['DecayCorrectionFactor']
-    elif 'DecayFactor' in pet_meta.keys():
-        decay_correction = pet_meta['DecayFactor']
-    else:
-        raise ValueError("Neither 'DecayCorrectionFactor' nor 'DecayFactor' exist in meta-data "
-                         "file")
 
-    if 'TracerRadionuclide' in pet_meta.keys():
-        tracer_isotope = pet_meta['TracerRadionuclide']
-        if verbose:
-            print(f"(ImageOps4d): Radio isotope is {tracer_isotope} "
-                f"with half life {half_life} s")
+    if image_frame_info is None:
+        pet_meta = image_io.load_metadata_for_nifti_with_same_filename(input_image_4d_path)
+        frame_start = pet_meta['FrameTimesStart']
+        frame_duration = pet_meta['FrameDuration']
+
+        if 'DecayCorrectionFactor' in pet_meta.keys():
+            decay_correction = pet_meta['DecayCorrectionFactor']
+        elif 'DecayFactor' in pet_meta.keys():
+            decay_correction = pet_meta['DecayFactor']
+        else:
+            raise ValueError("Neither 'DecayCorrectionFactor' nor 'DecayFactor' exist in meta-data "
+                             "file")
+
+        if 'TracerRadionuclide' in pet_meta.keys():
+            tracer_isotope = pet_meta['TracerRadionuclide']
+            if verbose:
+                print(f"(ImageOps4d): Radio isotope is {tracer_isotope} "
+                    f"with half life {half_life} s")
+    else:
+        frame_start = image_frame_info.start
+        frame_duration = image_frame_info.duration
+        decay_correction = image_frame_info.decay
 
+    # frames are read straight from the array proxy, which is memory-mapped for uncompressed
+    # NIfTI, so only the frames in the window are read, and in their on-disk precision
     if end_time==-1:
-        pet_series_adjusted = pet_series
+        pet_series_adjusted = np.asanyarray(pet_image.dataobj)
         frame_start_adjusted = frame_start
         frame_duration_adjusted = frame_duration
         decay_correction_adjusted = decay_correction
@@ -182,7 +193,7 @@ def weighted_series_sum(input_image_4d_path: str,
         calc_last_frame = int(nearest_frame(end_time+scan_start))
         if calc_first_frame==calc_last_frame:
             calc_last_frame += 1
-        pet_series_adjusted = pet_series[:,:,:,calc_first_frame:calc_last_frame]
+        pet_series_adjusted = pet_image.dataobj[:,:,:,calc_first_frame:calc_last_frame]
         frame_start_adjusted = frame_start[calc_first_frame:calc_last_frame]
         frame_duration_adjusted = frame_duration[calc_first_frame:calc_last_frame]
         decay_correction_adjusted = decay_correction[calc_first_frame:calc_last_frame]
@@ -0,0 +1,46 @@
+import json
+
+import nibabel
+import numpy as np
+import pytest
+
+from petpal.preproc import image_operations_4d
+
+
+@pytest.fixture
+def tac_inputs(tmp_path):
+    rng = np.random.default_rng(0)
+    pet = rng.random((6, 5, 7, 4)).astype(np.float32)
+    seg = rng.integers(0, 4, size=(6, 5, 7)).astype(np.float32)
+    frame_times = [0.5, 1.5, 3.0, 6.0]
+    affine = np.eye(4)
+    for name in ('pet.nii', 'pet.nii.gz'):
+        nibabel.save(nibabel.Nifti1Image(pet, affine), tmp_path / name)
+    (tmp_path / 'pet.json').write_text(json.dumps({'FrameReferenceTime': frame_times}))
+    nibabel.save(nibabel.Nifti1Image(seg, affine), tmp_path / 'seg.nii')
+    (tmp_path / 'labels.tsv').write_text('abbreviation\tmapping\nA\t1\nB\t2\nC\t3\n')
+    return tmp_path, pet, seg
+
+
+def _read_tacs(out_dir):
+    return {path.name: path.read_text() for path in sorted(out_dir.iterdir())}
+
+
+@pytest.mark.parametrize('pet_name', ['pet.nii', 'pet.nii.gz'])
+def test_write_tacs_z_tile_matches_full_read(tac_inputs, pet_name):
+    tmp_path, _, _ = tac_inputs
+    outputs = {}
+    for z_tile in (None, 3):
+        out_dir = tmp_path / f'tacs_{z_tile}'
+        out_dir.mkdir()
+        image_operations_4d.write_tacs(input_image_path=str(tmp_path / pet_name),
+                                       label_map_path=str(tmp_path / 'labels.tsv'),
+                                       segmentation_image_path=str(tmp_path / 'seg.nii'),
+                                       out_tac_dir=str(out_dir),
+                                       verbose=False,
+                                       frame_times=np.array([0.5, 1.5, 3.0, 6.0]),
+                                       z_tile=z_tile)
+        outputs[z_tile] = {name: np.loadtxt(out_dir / name, skiprows=1) for name in _read_tacs(out_dir)}
+    assert outputs[None].keys() == outputs[3].keys() == {'seg-A_tac.tsv', 'seg-B_tac.tsv', 'seg-C_tac.tsv'}
+    for name, tac in outputs[None].items():
+        np.testing.assert_allclose(outputs[3][name], tac, rtol=1e-6)
@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+import shutil
+import threading
+
+from petpal.pipelines import steps_base
+from petpal.pipelines.preproc_steps import ImageToImageStep
+from petpal.pipelines.steps_containers import StepsContainer, StepsPipeline
+
+
+def _write_image_with_meta(path, meta):
+    path.write_bytes(b'not really an image')
+    path.with_suffix('.json').write_text(json.dumps(meta))
+
+
+def _await_meta_in_child():
+    steps_base._await_meta()
+
+
+def test_execute_parallel_after_serial_step(tmp_path):
+    meta = {'TracerRadionuclide': 'C11'}
+    _write_image_with_meta(tmp_path / 'input.nii', meta)
+
+    serial_step = ImageToImageStep('serial_copy', shutil.copyfile,
+                                   str(tmp_path / 'input.nii'), str(tmp_path / 'serial.nii'))
+    serial_step.execute()
+
+    first = ImageToImageStep('first_copy', shutil.copyfile,
+                             str(tmp_path / 'serial.nii'), str(tmp_path / 'first.nii'))
+    second = ImageToImageStep('second_copy', shutil.copyfile,
+                              str(tmp_path / 'first.nii'), str(tmp_path / 'second.nii'))
+    pipeline = StepsPipeline(name='test', step_containers=[StepsContainer('copies', first, second)])
+    pipeline.add_dependency(sending='first_copy', receiving='second_copy')
+    pipeline.execute_parallel(max_workers=2)
+
+    assert (tmp_path / 'second.nii').read_bytes() == b'not really an image'
+    assert json.loads((tmp_path / 'second.json').read_text()) == meta
+
+
+def test_forked_child_does_not_wait_on_parent_meta_writes():
+    release = threading.Event()
+    steps_base._submit_meta_task('pending.nii', release.wait)
+    try:
+        child = multiprocessing.get_context('fork').Process(target=_await_meta_in_child)
+        child.start()
+        child.join(timeout=30)
+        alive = child.is_alive()
+        if alive:
+            child.kill()
+        assert not alive
+        assert child.exitcode == 0
+    finally:
+        release.set()
+        steps_base._await_meta()